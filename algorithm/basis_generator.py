@@ -1,55 +1,33 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
 from numpy.polynomial import Polynomial as pm
 __author__ = 'vlad'
 
 #Polynomi Legandra
 def basis_sh_legendre(degree):
-    basis = [pm([1])]
-    for i in range(degree):
-        if i == 0:
-            basis.append(pm([-1, 2]))
-            continue
-        basis.append((pm([-2*i - 1, 4*i + 2])*basis[-1] - i * basis[-2]) / (i + 1))
-    return basis
+    return FAMILIES['sh_legendre'].polynomials(degree + 1)
 
 #Polynomi Ermita
 def basis_hermite(degree):
-    basis = [pm([0]), pm([1])]
-    for i in range(degree):
-        basis.append(pm([0,2])*basis[-1] - 2 * i * basis[-2])
-    del basis[0]
-    return basis
+    return FAMILIES['hermite'].polynomials(degree + 1)
 
 #Polynomi Lagera
 def basis_laguerre(degree):
-    basis = [pm([1])]
-    for i in range(degree):
-        if i == 0:
-            basis.append(pm([1, -1]))
-            continue
-        basis.append(pm([2*i + 1, -1])*basis[-1] - i * i * basis[-2])
-    return basis
+    return FAMILIES['laguerre'].polynomials(degree + 1)
 
 #Polynomi Chebysheva Pervogo Roda
 def basis_chebyshev(degree):
-    basis = [pm([0.5]), pm([0, 1])]
-    for i in range(degree):
-        basis.append(pm([0,2]) * basis[-1] - basis[-2])
-    return basis
+    return FAMILIES['chebyshev'].polynomials(degree + 1)
 
 #Smeshennye polynomy Chebysheva pervogo roda
 def basis_sh_chebyshev(degree):
-    basis = [pm([0.5]), pm([-1, 2])]
-    for i in range(degree):
-        basis.append(pm([-2, 4])*basis[-1] - basis[-2])
-    del basis[0]
-    return basis
+    return FAMILIES['sh_chebyshev'].polynomials(degree + 1)
 
 #Polynomi Chebysheva Vtorogo Roda
 def basis_chebyshev_2(degree):
-    basis = [pm([0.5]), pm([0, 2])]
-    for i in range(degree):
-        basis.append(pm([0,2]) * basis[-1] - basis[-2])
-    return basis
+    return FAMILIES['chebyshev_2'].polynomials(degree + 1)
 
 #Smeshennye Chebysheva vtorogo roda
 '''
@@ -62,13 +40,7 @@ def basis_sh_chebyshev_2(degree):
 '''
 
 def basis_sh_chebyshev_2(degree):
-    basis = [pm([1])]
-    for i in range(degree):
-        if i == 0:
-            basis.append(pm([-2,4]))
-            continue
-        basis.append(pm([-2, 4]) * basis[-1] - basis[-2])
-    return basis
+    return FAMILIES['sh_chebyshev_2'].polynomials(degree + 1)
 
 #Hui zhaet shto
 def basis_sh_chebyshev_2_shrinked(degree):
@@ -76,3 +48,173 @@ def basis_sh_chebyshev_2_shrinked(degree):
     for i in range(degree):
         basis[i] /= (i + 1)
     return basis
+
+
+#Families of basis functions, the one source of basis values for Solve and of polynomials for PolynomialBuilder
+CACHE_SIZE = 64  # number of (family, count) coefficient tables kept in memory
+_coefficients_cache = OrderedDict()
+_coefficients_lock = threading.Lock()  # fits run in QThread while GUI thread builds reports
+
+
+class RecurrenceFamily(object):
+    """
+    Polynomials of three-term recurrence P_0 = 1, P_1 = a_0 x + b_0, P_{k+1} = (a_k x + b_k) P_k - g_k P_{k-1}
+    """
+
+    def __init__(self, name, first, step):
+        """
+        :param name: key of family in FAMILIES
+        :param first: (a_0, b_0)
+        :param step: function of k >= 1 returning (a_k, b_k, g_k)
+        """
+        self.name = name
+        self.first = first
+        self.step = step
+
+    def _recurrence(self, k):
+        return self.first + (0,) if k == 0 else self.step(k)
+
+    def coefficients(self, count):
+        """
+        Power coefficients of P_0..P_{count-1}, memoized per (family, count) with LRU eviction
+        :return: read-only ndarray with shape (count, count), row k - coefficients of P_k from x^0
+        """
+        key = (self.name, count)
+        with _coefficients_lock:
+            if key in _coefficients_cache:
+                _coefficients_cache.move_to_end(key)
+                return _coefficients_cache[key]
+        table = np.zeros((count, count))
+        if count > 0:
+            table[0, 0] = 1
+        for k in range(count - 1):
+            a, b, g = self._recurrence(k)
+            table[k + 1, 1:] = a * table[k, :-1]
+            table[k + 1] += b * table[k]
+            if k:
+                table[k + 1] -= g * table[k - 1]
+        table.flags.writeable = False  # shared by all callers
+        with _coefficients_lock:  # built outside the lock, a table built twice by two threads is the same
+            _coefficients_cache[key] = table
+            while len(_coefficients_cache) > CACHE_SIZE:
+                _coefficients_cache.popitem(last=False)
+        return table
+
+    def polynomials(self, count):
+        """
+        :return: new list of P_0..P_{count-1} as numpy Polynomial objects, callers may change it
+        """
+        return [pm(row[:k + 1]) for k, row in enumerate(self.coefficients(count))]
+
+    def evaluate(self, x, count, out=None):
+        """
+        Values of P_0..P_{count-1} by the recurrence over arrays
+        :param x: ndarray of points
+        :param count: number of polynomials
+        :param out: preallocated array with shape x.shape + (count,)
+        :return: array with shape x.shape + (count,)
+        """
+        x = np.asarray(x, dtype=float)
+        if out is None:
+            out = np.empty(x.shape + (count,), dtype=float)
+        if count > 0:
+            out[..., 0] = 1
+        factor, factor_key = None, None
+        for k in range(count - 1):
+            a, b, g = self._recurrence(k)
+            if factor_key != (a, b):  # families of constant recurrence compute it once
+                factor, factor_key = a * x + b if b else a * x, (a, b)
+            np.multiply(factor, out[..., k], out=out[..., k + 1])
+            if k and g:
+                np.subtract(out[..., k + 1], out[..., k - 1] if g == 1 else g * out[..., k - 1], out=out[..., k + 1])
+        return out
+
+    def series(self, x, c):
+        """
+        Sum of c_k * P_k(x) by Clenshaw's scheme
+        :param x: ndarray of points
+        :param c: coefficients c_0..c_n
+        :return: array with shape of x
+        """
+        x = np.asarray(x, dtype=float)
+        if len(c) == 0:
+            return np.zeros_like(x)
+        b1, b2 = np.zeros_like(x), np.zeros_like(x)  # b_{k+1}, b_{k+2}
+        for k in range(len(c) - 1, 0, -1):
+            a, b, _ = self._recurrence(k)
+            b1, b2 = c[k] + (a * x + b) * b1 - self._recurrence(k + 1)[2] * b2, b1
+        a, b = self.first
+        return c[0] + (a * x + b) * b1 - self._recurrence(1)[2] * b2
+
+    def value(self, degree, x):
+        """
+        :return: P_degree(x), with the signature of scipy.special.eval_chebyt
+        """
+        return self.series(x, np.eye(degree + 1)[degree])
+
+
+class DegreeFreeFamily(object):
+    """
+    Functions that do not depend on degree (i.e. cos, arctg), they have no polynomial form
+    """
+
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self.evaluate = eval_degree_free(func)
+
+    def polynomials(self, count):
+        raise ValueError('{} functions have no polynomial form'.format(self.name))
+
+    coefficients = polynomials
+
+    def value(self, degree, x):
+        return self.func(np.asarray(x, dtype=float))
+
+
+def eval_degree_free(func):
+    """
+    Builds evaluator for functions that do not depend on degree (i.e. cos, arctg)
+    :param func: function of x
+    :return: evaluator with the same signature as eval_chebyshev
+    """
+    def evaluate(x, degree, out=None):
+        x = np.asarray(x, dtype=float)
+        if out is None:
+            out = np.empty(x.shape + (degree,), dtype=float)
+        out[...] = func(x)[..., np.newaxis]
+        return out
+    return evaluate
+
+
+FAMILIES = {family.name: family for family in (
+    RecurrenceFamily('chebyshev', (1, 0), lambda k: (2, 0, 1)),
+    RecurrenceFamily('sh_chebyshev', (2, -1), lambda k: (4, -2, 1)),
+    RecurrenceFamily('chebyshev_2', (2, 0), lambda k: (2, 0, 1)),
+    RecurrenceFamily('sh_chebyshev_2', (4, -2), lambda k: (4, -2, 1)),
+    RecurrenceFamily('sh_legendre', (2, -1), lambda k: ((4 * k + 2) / (k + 1), -(2 * k + 1) / (k + 1), k / (k + 1))),
+    RecurrenceFamily('hermite', (2, 0), lambda k: (2, 0, 2 * k)),
+    RecurrenceFamily('laguerre', (-1, 1), lambda k: (-1, 2 * k + 1, k * k)),
+    DegreeFreeFamily('cos', lambda x: (np.cos(x) + np.pi) / (2 * np.pi)),
+    DegreeFreeFamily('arctg', lambda x: (np.arctan(x) + np.pi / 2) / np.pi),
+)}
+
+# family of every poly_type of Solve; sh_cheb_u has always been fitted with shifted polynomials of the first kind
+POLY_TYPES = dict(cheb_t='chebyshev', sh_cheb_t='sh_chebyshev', cheb_u='chebyshev_2', sh_cheb_u='sh_chebyshev',
+                  cos='cos', arctg='arctg')
+
+
+def basis_family(poly_type):
+    """
+    :param poly_type: poly_type param of Solve
+    :return: RecurrenceFamily or DegreeFreeFamily
+    """
+    if poly_type not in POLY_TYPES:
+        raise ValueError('Unknown poly_type: {}'.format(poly_type))
+    return FAMILIES[POLY_TYPES[poly_type]]
+
+
+eval_chebyshev = FAMILIES['chebyshev'].evaluate
+eval_sh_chebyshev = FAMILIES['sh_chebyshev'].evaluate
+eval_chebyshev_2 = FAMILIES['chebyshev_2'].evaluate
+eval_sh_chebyshev_2 = FAMILIES['sh_chebyshev_2'].evaluate
@@ -0,0 +1,123 @@
+"""
+Headless runner of many fits.
+
+    python -m algorithm.batch jobs.yaml --workers 4 --summary summary.json
+
+Job file (JSON, or YAML if its extension is .yaml/.yml) is either a list of jobs or
+{"defaults": {...}, "jobs": [...]}. Job has the keys of Solve params (poly_type, degrees, dimensions,
+samples, weights, lambda_multiblock, input_file, output_file, ...) and optionally
+name and custom_struct (true fits SolveExpTh). With instrument: true the summary has profile of every
+stage (wall and CPU time, peak memory, number of least squares solutions). Relative paths are resolved against directory of job file.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from .solve import Solve
+from .solve_custom import SolveExpTh
+
+DEFAULTS = dict(poly_type='cheb_t', weights='average', lambda_multiblock=False, output_file='')
+REQUIRED = ('input_file', 'samples', 'dimensions', 'degrees')
+
+
+def load_jobs(filename):
+    """
+    :param filename: path to JSON or YAML job file
+    :return: list of job dicts with defaults applied and paths resolved
+    """
+    with open(filename, encoding='utf8') as f:
+        if os.path.splitext(filename)[1].lower() in ('.yaml', '.yml'):
+            import yaml
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    if isinstance(spec, list):
+        spec = dict(jobs=spec)
+    defaults = dict(DEFAULTS, **spec.get('defaults', {}))
+    base = os.path.dirname(os.path.abspath(filename))
+    jobs = []
+    for index, job in enumerate(spec['jobs']):
+        job = dict(defaults, **job)
+        job.setdefault('name', 'job{}'.format(index + 1))
+        for key in ('input_file', 'output_file', 'forecast_cache_dir'):
+            if job.get(key):
+                job[key] = os.path.join(base, job[key])
+        jobs.append(job)
+    return jobs
+
+
+def _floats(values):
+    # strict JSON has no NaN and infinity
+    return [float(v) if math.isfinite(v) else None for v in values]
+
+
+def run_job(job):
+    """
+    Fits one job, never raises
+    :return: summary dict: name, status ('ok' or 'failed'), errors, wall time of every stage
+    """
+    summary = dict(name=job['name'], status='failed', timings={})
+    start = time.perf_counter()
+    stages = []  # (stage, start time)
+
+    def progress(index, count, stage):
+        stages.append((stage, time.perf_counter()))
+
+    try:
+        missing = [key for key in REQUIRED if key not in job]
+        if missing:
+            raise ValueError('missing keys: ' + ', '.join(missing))
+        solver_class = SolveExpTh if job.get('custom_struct') else Solve
+        solver = solver_class(job)
+        solver.prepare(progress)
+        summary.update(status='ok', norm_error=_floats(solver.norm_error), norm_error_a=_floats(solver.norm_error_a),
+                       error=_floats(solver.error), error_a=_floats(solver.error_a))
+        if solver.stage_profile is not None:
+            summary['profile'] = solver.stage_profile.as_dicts()
+    except Exception as e:
+        summary.update(error_type=type(e).__name__, message=str(e), traceback=traceback.format_exc())
+    end = time.perf_counter()
+    for (stage, begin), (_, finish) in zip(stages, stages[1:] + [(None, end)]):
+        summary['timings'][stage] = finish - begin
+    summary['total_time'] = end - start
+    return summary
+
+
+def run_jobs(jobs, workers=1):
+    """
+    :param workers: number of processes; 1 runs the jobs in current process
+    :return: list of summaries in the order of jobs
+    """
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(min(workers, len(jobs))) as executor:
+            return list(executor.map(run_job, jobs))
+    return [run_job(job) for job in jobs]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m algorithm.batch', description='Runs fits described in job file')
+    parser.add_argument('jobs', help='JSON or YAML job file')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='number of processes')
+    parser.add_argument('-s', '--summary', help='file to write JSON summary to, stdout by default')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = run_jobs(load_jobs(args.jobs), args.workers)
+    summary = dict(jobs=results, total_time=time.perf_counter() - start,
+                   failed=sum(result['status'] != 'ok' for result in results))
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    else:
+        json.dump(summary, sys.stdout, indent=2, ensure_ascii=False)
+        sys.stdout.write('\n')
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
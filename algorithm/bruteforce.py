@@ -1,14 +1,53 @@
 #coding: utf8
 
-from PyQt5.QtCore import pyqtSlot, pyqtSignal
+import os
+
+from PyQt5.QtCore import QObject, QThread, pyqtSlot, pyqtSignal
 from PyQt5.QtWidgets import QDialog, QMessageBox
-from PyQt5.uic import loadUiType
 
 from .calculate_optimal_degrees import *
 from .solve_custom import SolveExpTh
 from .solve import Solve
+from .ui_loader import load_ui_type
+
+form_class, base_class = load_ui_type('bruteforce_window.ui')
+
+
+class DegreeSearchWorker(QObject):
+    """
+    Runs determine_deg outside of GUI thread and streams evaluated candidates.
+    Move it to QThread and connect thread's started signal to run().
+    """
+    evaluated = pyqtSignal(object, float, object, float)  # degrees, error, best degrees, best error
+    finished = pyqtSignal(object)  # best (degrees, error, error vector), None if nothing was evaluated
+    failed = pyqtSignal(str)
+
+    def __init__(self, solver, grid, workers=1, budget=None):
+        super(DegreeSearchWorker, self).__init__()
+        self.solver = solver
+        self.grid = grid
+        self.workers = workers
+        self.budget = budget
+        self._cancel_requested = False
 
-form_class, base_class = loadUiType('bruteforce_window.ui')
+    def cancel(self):
+        """
+        Asks to stop the search, the best result found so far is returned
+        """
+        self._cancel_requested = True
+
+    def _on_result(self, result, best):
+        self.evaluated.emit(result[0], result[1], best[0], best[1])
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            best = determine_deg(self.solver, *self.grid, workers=self.workers, callback=self._on_result,
+                                 should_stop=lambda: self._cancel_requested, budget=self.budget)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(best)
 
 
 class BruteForceWindow(QDialog, form_class):
@@ -17,6 +56,10 @@ class BruteForceWindow(QDialog, form_class):
     def __init__(self, *args):
         super(BruteForceWindow, self).__init__(*args)
         self.setupUi(self)
+        self.workers_spin.setMaximum(os.cpu_count() or 1)
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        self.search_thread = None
+        self.search_worker = None
 
     @staticmethod
     def launch(parent):
@@ -37,7 +80,49 @@ class BruteForceWindow(QDialog, form_class):
         else:
             solver = Solve(self.params)
         p = [[i for i in range(self.low_edge[j], self.high_edge[j]+1, self.step[j])] for j in range(len(self.step))]
-        best_deg = determine_deg(solver, p[0], p[1], p[2])
+        if not all(p):
+            QMessageBox.warning(self, 'Error!', 'Empty range of degrees')
+            return
+        self.results_list.clear()
+        self.best_label.setText('Лучший результат: -')
+        self.search_progress.setMaximum(len(p[0]) * len(p[1]) * len(p[2]))
+        self.search_progress.setValue(0)
+        self.pushButton.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+
+        self.search_thread = QThread(self)
+        self.search_worker = DegreeSearchWorker(solver, p, workers=self.workers_spin.value(),
+                                                budget=self.budget_spin.value() or None)
+        self.search_worker.moveToThread(self.search_thread)
+        self.search_thread.started.connect(self.search_worker.run)
+        self.search_worker.evaluated.connect(self.candidate_evaluated)
+        self.search_worker.finished.connect(self.search_finished)
+        self.search_worker.failed.connect(self.search_failed)
+        self.search_thread.start()
+        return
+
+    @pyqtSlot()
+    def cancel_clicked(self):
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+            self.cancel_button.setEnabled(False)
+
+    @pyqtSlot(object, float, object, float)
+    def candidate_evaluated(self, degrees, error, best_degrees, best_error):
+        if self.search_worker is None:  # queued before the search was stopped
+            return
+        self.results_list.addItem('{0}: {1:.6g}'.format(degrees, error))
+        self.best_label.setText('Лучший результат: {0}: {1:.6g}'.format(best_degrees, best_error))
+        self.search_progress.setValue(self.search_progress.value() + 1)
+
+    @pyqtSlot(object)
+    def search_finished(self, best_deg):
+        if self.search_worker is None:  # dialog was closed, the result is not wanted
+            return
+        self._stop_search()
+        if best_deg is None:
+            QMessageBox.information(self, 'Brute Force', 'No degrees were evaluated')
+            return
         bd = best_deg[0]
         self.res_1.setValue(bd[0])
         self.res_2.setValue(bd[1])
@@ -53,14 +138,31 @@ class BruteForceWindow(QDialog, form_class):
         if ret == QMessageBox.Ok:
             self.update_degrees.emit(bd[0],bd[1], bd[2])
             self.close()
-        # result = QMessageBox.question(self, 'Long-time operation',
-        #                               'Adjusting degrees lasts long. Do you want to perform it?',
-        #                               QMessageBox.Ok | QMessageBox.No)
-        # if result == QMessageBox.Ok:
-        #     BruteForceWindow.launch(self)
 
-        #self.update_degrees.emit(3,3,3)
-        return
+    @pyqtSlot(str)
+    def search_failed(self, message):
+        if self.search_worker is None:
+            return
+        self._stop_search()
+        QMessageBox.warning(self, 'Error!', 'Error happened during degree search: ' + message)
+
+    def _stop_search(self):
+        self.search_thread.quit()
+        self.search_thread.wait()
+        self.search_thread = None
+        self.search_worker = None
+        self.pushButton.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+
+    def closeEvent(self, event):
+        # the search thread must not outlive the dialog, and its results must not reach the closed dialog
+        if self.search_worker is not None:
+            self.search_worker.evaluated.disconnect(self.candidate_evaluated)
+            self.search_worker.finished.disconnect(self.search_finished)
+            self.search_worker.failed.disconnect(self.search_failed)
+            self.search_worker.cancel()
+            self._stop_search()
+        super(BruteForceWindow, self).closeEvent(event)
 
     def _process_bruteforce(self, lower, upper):
         pass
@@ -0,0 +1,51 @@
+"""
+Sidecar cache files derived from a source file, i.e. parsed data (.npy) or compiled form (.py).
+Cache is named '.<source name>.<key>.<extension>' next to the source, the key changes with path,
+modification time and size of the source, so a changed source never meets its old cache.
+"""
+import hashlib
+import os
+import re
+from glob import glob, escape
+
+__author__ = 'vlad'
+
+
+def cache_path(filename, extension):
+    """
+    :return: path of sidecar cache keyed on absolute path, modification time and size of file
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    key = hashlib.sha1('{}|{}|{}'.format(path, stat.st_mtime_ns, stat.st_size).encode()).hexdigest()[:16]
+    return os.path.join(os.path.dirname(path), '.{}.{}.{}'.format(os.path.basename(path), key, extension))
+
+
+def write_cache(cache, write, mode='wb'):
+    """
+    Writes cache atomically and removes caches of previous versions of the same source
+    :param cache: path from cache_path
+    :param write: function of opened file that writes the content
+    :param mode: 'wb' or 'w' (utf8 text)
+    :return: False if cache could not be written (i.e. read-only directory)
+    """
+    directory, name = os.path.split(cache)
+    prefix, key, extension = name.rsplit('.', 2)
+    tmp = '{}.{}.tmp'.format(cache, os.getpid())
+    try:
+        with open(tmp, mode, encoding=None if 'b' in mode else 'utf8') as f:
+            write(f)
+        os.replace(tmp, cache)  # readers never see partially written cache
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+    # only '<prefix>.<16 hex digits>.<extension>', caches of i.e. data.txt.bak also start with the prefix of data.txt
+    own = re.compile(re.escape(prefix) + r'\.[0-9a-f]{16}\.' + re.escape(extension))
+    for stale in glob(os.path.join(escape(directory), escape(prefix) + '.*.' + escape(extension))):
+        if stale != cache and own.fullmatch(os.path.basename(stale)):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return True
@@ -1,11 +1,25 @@
+import time
+
 import numpy as np
 from itertools import product
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+_worker_solver = None  # solver of the current pool process, its data is loaded once in _init_worker
 
 
-def determine_deg(a, p1, p2, p3):
-    def _brute(args):
-        i, j, k = args
-        a.deg = [i + 1, j + 1, k + 1]
+def _prepare(a, max_deg):
+    a.define_data()
+    a.norm_data()
+    a.define_norm_vectors()
+    a.built_B()
+    a.poly_func()
+    a.cache_basis(max_deg)  # every candidate slices its A from basis of the largest degrees
+
+
+def _brute(a, args):
+    i, j, k = args
+    a.deg = [i + 1, j + 1, k + 1]
+    try:
         a.built_A()
         a.lamb()
         a.psi()
@@ -14,17 +28,72 @@ def determine_deg(a, p1, p2, p3):
         a.built_c()
         a.built_F()
         a.built_F_()
-        res = np.linalg.norm(a.norm_error, np.inf)
-        print (i, j, k), ':', np.linalg.norm(a.norm_error, np.inf)
-        return (i, j, k), res, a.norm_error
-    a.define_data()
-    a.norm_data()
-    a.define_norm_vectors()
-    a.built_B()
-    a.poly_func()
-    d = map(_brute, product(p1, p2, p3))
-    best = d[0]
-    for i in d:
-        if i[1] < best[1]:
-            best = i
-    return best
+    except ValueError:  # non-finite system of these degrees, the candidate loses (see _rank)
+        return (i, j, k), np.nan, np.full(a.dim[3], np.nan)
+    res = np.linalg.norm(a.norm_error, np.inf)
+    return (i, j, k), res, a.norm_error
+
+
+def _init_worker(solver_class, params, max_deg):
+    global _worker_solver
+    _worker_solver = solver_class(params)
+    _prepare(_worker_solver, max_deg)
+
+
+def _brute_in_worker(args):
+    return _brute(_worker_solver, args)
+
+
+def _rank(result, index):
+    # NaN errors never win; ties are resolved by the grid order, so serial and parallel searches agree
+    res = result[1]
+    return (res if res == res else np.inf), index
+
+
+def determine_deg(a, p1, p2, p3, workers=1, callback=None, should_stop=None, budget=None):
+    """
+    Searches degrees with minimal normalized error over grid p1 x p2 x p3
+    :param a: solver (Solve or its subclass)
+    :param workers: number of processes; 1 runs the search in current process
+    :param callback: called as callback(result, best) after every evaluated candidate,
+    result and best are (degrees, error, error vector)
+    :param should_stop: function without arguments, the search stops when it returns True
+    :param budget: wall-clock limit of the search in seconds, None means no limit
+    :return: (degrees, error, error vector) of the best evaluated configuration, None if nothing was evaluated
+    """
+    grid = list(product(p1, p2, p3))
+    max_deg = [max(p1) + 1, max(p2) + 1, max(p3) + 1]
+    deadline = None if budget is None else time.monotonic() + budget
+    best = [None, None]  # best result and its rank
+
+    def stopped():
+        return (should_stop is not None and should_stop()) or (deadline is not None and time.monotonic() > deadline)
+
+    def accept(result, index):
+        rank = _rank(result, index)
+        if best[0] is None or rank < best[1]:
+            best[0], best[1] = result, rank
+        if callback is not None:
+            callback(result, best[0])
+
+    if workers > 1:
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(type(a), a.params, max_deg))
+        try:
+            futures = {executor.submit(_brute_in_worker, args): index for index, args in enumerate(grid)}
+            pending = set(futures)
+            while pending and not stopped():
+                # short timeout keeps the stop request and the budget responsive while candidates are computed
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=futures.get):
+                    accept(future.result(), futures[future])
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+    else:
+        _prepare(a, max_deg)
+        for index, args in enumerate(grid):
+            if stopped():
+                break
+            accept(_brute(a, args), index)
+    return best[0]
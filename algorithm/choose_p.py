@@ -14,11 +14,12 @@ a.poly_func()
 def test_p(a,p1,p2,p3):
     d = list()
     #d = dict()
+    a.cache_basis([p1, p2, p3])
     for i in range(1,p1):
         for j in range(1,p2):
             for k in range(1,p3):
-                a.p = [i+1,j+1,k+1]
-                print(a.p)
+                a.deg = [i+1,j+1,k+1]
+                print(a.deg)
                 a.built_A()
                 a.lamb()
                 a.psi()
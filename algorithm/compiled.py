@@ -0,0 +1,109 @@
+"""
+Fitted model compiled to plain arrays for fast scoring.
+
+All components of a vector X1, X2 or X3 share one basis, so it is stored once as power coefficients and evaluated
+by Horner's scheme for all rows and components at once. For the multiplicative structure of Solve the three levels
+collapse to one weighted sum, F = exp(sum(c*a*lambda*log(1 + P(x)))) - 1, and denormalization of Y is folded into
+the outer multiplier and shift.
+
+Polynomials are kept in normalized units t = (x - min) / span rather than expanded in x: on the borders of the
+training range 1 + P(t) is exactly zero for many bases, and the rounding of the expanded form there is amplified by
+the logarithm.
+
+Precision. Power coefficients of a degree-p Chebyshev basis grow like 4^p, so Horner's scheme loses accuracy with
+degree: the basis differs from the recurrence of Solve by ~1e-15 at p <= 3, ~1e-13 at p = 5, ~1e-11 at p = 8 and
+~1e-9 at p = 10. tanh and arctan structures pass that on, predictions agree with Solve.predict to ~1e-12 relative up
+to p = 10. The log structure amplifies it where 1 + P(t) is small: on synthetic data predictions agree to ~1e-8
+relative at p <= 4, ~1e-6 at p = 5..6, ~1e-5 at p = 8 and ~1e-4 at p = 10, for both forms of predict(). The collapsed
+form also drops the small offset Solve adds inside every logarithm, which differs from Solve.predict only near
+points where 1 + P(t) is zero; predict(X, collapsed=False) keeps it. benchmarks/bench_scoring.py checks agreement.
+"""
+from math import pi
+
+import numpy as np
+
+__author__ = 'vlad'
+
+OFFSET = 1e-10  # the same as Solve.OFFSET
+
+TRANSFORMS = dict(log=lambda values: np.log(1 + values + OFFSET),
+                  tanh=np.tanh,
+                  arctan=lambda values: 2 / pi * np.arctan(values))
+
+
+class CompiledModel(object):
+    """
+    Evaluator of F(x) built by PolynomialBuilder.compile()
+    """
+
+    def __init__(self, bases, dimensions, x_min, x_span, lamb, a, c, y_min, y_span, transform='log'):
+        """
+        :param bases: for X1, X2, X3 power coefficients of P_0..P_{p-1} from t^0, shape (p, p)
+        :param dimensions: [dim X1, dim X2, dim X3, dim Y]
+        :param x_min: minimums of X columns
+        :param x_span: maximum - minimum of X columns
+        :param lamb: Lamb of solver, shape (m1*p1 + m2*p2 + m3*p3, dim[3])
+        :param a: a of solver, shape (mX, dim[3])
+        :param c: c of solver, shape (3, dim[3])
+        :param y_min: minimums of Y
+        :param y_span: maximum - minimum of Y
+        :param transform: applied to values before they are weighted: 'log', 'tanh' or 'arctan'
+        """
+        self.bases = [np.asarray(basis, dtype=float) for basis in bases]
+        self.dim = list(dimensions)
+        self.x_min = np.asarray(x_min, dtype=float)
+        self.x_span = np.asarray(x_span, dtype=float)
+        self.transform = transform
+        self._inner = TRANSFORMS[transform]
+        self.y_span = np.asarray(y_span, dtype=float)
+        self.y_shift = np.asarray(y_min, dtype=float) - self.y_span  # F + 1 is what is calculated
+        # weights split by vectors: lamb as (component, degree, Y), a as (component, Y)
+        sizes = [self.dim[j] * len(self.bases[j]) for j in range(3)]
+        self.lamb = [l.reshape(self.dim[j], len(self.bases[j]), -1) for j, l in
+                     enumerate(np.split(np.asarray(lamb, dtype=float), np.cumsum(sizes[:2])))]
+        self.a = np.split(np.asarray(a, dtype=float), np.cumsum(self.dim[:2]))
+        self.c = np.asarray(c, dtype=float)
+        self.weights = None
+        if transform == 'log':
+            # log(1 + exp(s) - 1) = s, so every level is a linear map of the previous one;
+            # weights are (degree, component, Y), the layout basis() writes values in
+            self.weights = [(self.lamb[j] * (self.a[j] * self.c[j])[:, np.newaxis]).transpose(1, 0, 2)
+                            for j in range(3)]
+
+    def basis(self, X):
+        """
+        :param X: rows of X in original units, shape (rows, mX)
+        :return: for X1, X2, X3 values of basis polynomials, shape (p, m, rows)
+        """
+        t = (np.asarray(X, dtype=float) - self.x_min).T
+        t /= self.x_span[:, np.newaxis]  # the same rounding as MinMaxScaler.normalize
+        values = list()
+        for basis, t_j in zip(self.bases, np.split(t, np.cumsum(self.dim[:2]))):
+            # degree-major layout keeps every step of the scheme a contiguous operation
+            result = np.empty((len(basis),) + t_j.shape)
+            result[...] = basis[:, -1, np.newaxis, np.newaxis]
+            for power in range(basis.shape[1] - 2, -1, -1):
+                result *= t_j
+                result += basis[:, power, np.newaxis, np.newaxis]
+            values.append(result)
+        return values
+
+    def predict(self, X, collapsed=True):
+        """
+        :param X: array with shape (m, mX) in original units
+        :param collapsed: use one weighted sum for the log structure instead of three levels
+        :return: ndarray with shape (m, dim[3]) in original units, Solve.predict within precision of the module
+        """
+        values = [self._inner(v) for v in self.basis(np.atleast_2d(X))]
+        if collapsed and self.weights is not None:
+            log_f = sum(np.tensordot(v, w, axes=([0, 1], [0, 1])) for v, w in zip(values, self.weights))
+        else:
+            log_f = 0
+            for j, v in enumerate(values):
+                psi = np.exp(v.transpose(1, 2, 0) @ self.lamb[j]) - 1  # (component, row, Y)
+                big_phi = np.exp(np.einsum('mri,mi->ri', self._inner(psi), self.a[j])) - 1
+                log_f = log_f + self._inner(big_phi) * self.c[j]
+        return self.y_span * np.exp(log_f) + self.y_shift
+
+    def __call__(self, X, collapsed=True):
+        return self.predict(X, collapsed)
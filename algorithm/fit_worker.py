@@ -0,0 +1,65 @@
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+
+__author__ = 'vlad'
+
+
+class FitCancelled(Exception):
+    pass
+
+
+def _format_profile(profile):
+    from tabulate import tabulate
+    stages, fields, rows = profile.as_table()
+    return 'Профиль этапов (с, MiB):\n' + tabulate([[stage] + row for stage, row in zip(stages, rows)],
+                                                  headers=['stage'] + fields, floatfmt='.4f')
+
+
+class FitWorker(QObject):
+    """
+    Fits solver and builds its results outside of GUI thread.
+    Move it to QThread and connect thread's started signal to run().
+    """
+    progress = pyqtSignal(int, int, str)  # index of stage, number of stages, stage name
+    finished = pyqtSignal(object, object, str)  # fitted solver, its PolynomialBuilder, results text
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, solver_class, builder_class, params, report_rows=None):
+        """
+        :param report_rows: tables of results text are cut to this number of rows, None keeps all rows
+        """
+        super(FitWorker, self).__init__()
+        self.solver_class = solver_class
+        self.builder_class = builder_class
+        self.params = params
+        self.report_rows = report_rows
+        self._cancel_requested = False
+
+    def cancel(self):
+        """
+        Asks to stop fitting, it stops before the next stage
+        """
+        self._cancel_requested = True
+
+    def _on_stage(self, index, count, stage):
+        if self._cancel_requested:
+            raise FitCancelled()
+        self.progress.emit(index, count, stage)
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            solver = self.solver_class(self.params)
+            solver.prepare(self._on_stage)
+            self._on_stage(len(solver.STAGES), len(solver.STAGES), 'results')
+            builder = self.builder_class(solver)
+            text = solver.show(self.report_rows) + '\n\n' + builder.get_results()
+            if solver.stage_profile is not None:
+                text = _format_profile(solver.stage_profile) + '\n\n' + text
+        except FitCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(solver, builder, text)
@@ -1,37 +1,196 @@
 __author__ = 'vlad'
+import hashlib
+import os
 import warnings
 import math
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
-from statsmodels.tsa.arima_model import ARIMA
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.optimize import brute
 
+# (p, d, q) candidates in the order of the former brute grid (slice(1, 5), slice(0, 3), slice(0, 5))
+ORDERS = [(p, d, q) for p in range(1, 5) for d in range(0, 3) for q in range(0, 5)]
 
-def choose_arima_order(endog):
-    def objfunc(order, *params):
-        series = params
 
-        try:
-            mod = ARIMA(series, order, exog=None)
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                res = mod.fit(disp=0, solver='bfgs', maxiter=5000)
-        except:
-            return float('inf')
-        if math.isnan(res.aic):
-            return float('inf')
-        return res.aic
+class _Pruned(Exception):
+    pass
+
+
+class _PruneCallback(object):
+    """
+    Called by optimizer on every iteration.
+    AIC at current parameters only goes down during optimization, so it never proves the candidate will lose;
+    the fit is stopped as hopeless if after `patience` iterations its AIC is still worse than `bound` by more
+    than `margin` (relative). It is a heuristic: a stopped candidate could have won, so it is used only on request.
+    """
+
+    def __init__(self, model, bound, patience=50, margin=0.1):
+        self.model = model
+        self.bound = bound
+        self.patience = patience
+        self.margin = margin
+        self.iteration = 0
+
+    def __call__(self, params):
+        self.iteration += 1
+        if self.iteration < self.patience or self.iteration % 10:
+            return
+        aic = -2 * self.model.loglike(params) + 2 * (len(params) + 1)
+        if aic > self.bound + self.margin * abs(self.bound):
+            raise _Pruned()
+
+
+def _fit_order(endog, order, bound=None):
+    """
+    :param bound: AIC to prune the fit against, None fits to convergence
+    :return: (aic, fitted model) or (inf, None) if the order can't be fitted or is pruned
+    """
+    from statsmodels.tsa.arima_model import ARIMA
+    try:
+        mod = ARIMA(endog, order, exog=None)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            res = mod.fit(disp=0, solver='bfgs', maxiter=5000,
+                          callback=_PruneCallback(mod, bound) if bound is not None else None)
+    except Exception:
+        return float('inf'), None
+    if math.isnan(res.aic):
+        return float('inf'), None
+    return res.aic, res
+
+
+def _fit_order_args(args):
+    return _fit_order(*args)
+
+
+def _choose_order(endog, workers=1, prune=False):
+    """
+    :param prune: stop hopeless candidates early; may choose another order than the full search
+    :return: (order, fitted model) with minimal AIC among ORDERS
+    """
+    fits = [None] * len(ORDERS)
+    bound = None
+    if prune:
+        # the bound is the AIC of the first order fitted in full, not the best AIC finished so far,
+        # so which candidates are pruned does not depend on the number of workers and timing of fits
+        fits[0] = _fit_order(endog, ORDERS[0])
+        bound = fits[0][0] if fits[0][1] is not None else None
+    tasks = [(endog, order, bound) for order, fit in zip(ORDERS, fits) if fit is None]
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            results = iter(list(executor.map(_fit_order_args, tasks)))
+    else:
+        results = (_fit_order(*task) for task in tasks)
+    fits = [fit if fit is not None else next(results) for fit in fits]
+    # the first of equal AICs wins, as in the former brute search
+    best = min(range(len(fits)), key=lambda i: fits[i][0])
+    if fits[best][1] is None:
+        raise ValueError('No ARIMA order could be fitted')
+    return ORDERS[best], fits[best][1]
+
+
+def choose_arima_order(endog, workers=1, prune=False):
+    """
+    Fits all orders of ORDERS and returns the fitted model with minimal AIC (no refit)
+    :param endog: series
+    :param workers: number of processes, 1 fits candidates in current process
+    :param prune: stop candidates whose AIC after 50 iterations is still 10% worse than AIC of the first order;
+                  faster, but a stopped candidate could have won, so the chosen order may differ from the full search
+    :return: fitted ARIMA model
+    """
+    return _choose_order(endog, workers, prune)[1]
+
+
+def series_key(x):
+    """
+    :return: hash of series values
+    """
+    return hashlib.sha1(np.ascontiguousarray(x, dtype=float).tobytes()).hexdigest()
+
 
-    grid = (slice(1, 5, 1), slice(0, 3, 1), slice(0, 5, 1))
+class ForecastCache(object):
+    """
+    Cache of forecasts per (series, steps) and of selected ARIMA order with fitted parameters per series.
+    Entries are kept in memory with LRU eviction and, if directory is given, on disk.
+    """
 
-    t = brute(objfunc, grid, args=endog, finish=None).astype(int)
+    def __init__(self, maxsize=128, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self._models = OrderedDict()  # series key -> (order, params)
+        self._forecasts = OrderedDict()  # (series key, steps) -> forecast
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
 
-    return ARIMA(endog, t, exog=None).fit()
+    def _remember(self, storage, key, value):
+        storage[key] = value
+        storage.move_to_end(key)
+        while len(storage) > self.maxsize:
+            storage.popitem(last=False)
 
+    def _recall(self, storage, key, filename, load):
+        if key in storage:
+            storage.move_to_end(key)
+            return storage[key]
+        if self.directory is not None and os.path.exists(os.path.join(self.directory, filename)):
+            with np.load(os.path.join(self.directory, filename)) as f:
+                value = load(f)
+            self._remember(storage, key, value)
+            return value
+        return None
 
-def forecast(x, steps):
-    mod = choose_arima_order(x[:-steps])
+    def _save(self, filename, **arrays):
+        if self.directory is not None:
+            np.savez(os.path.join(self.directory, filename), **arrays)
+
+    def get_model(self, key):
+        """
+        :return: (order, params) selected for series or None
+        """
+        return self._recall(self._models, key, key + '.model.npz',
+                            lambda f: (tuple(int(i) for i in f['order']), f['params']))
+
+    def set_model(self, key, order, params):
+        self._remember(self._models, key, (order, params))
+        self._save(key + '.model.npz', order=np.array(order), params=np.asarray(params))
+
+    def get_forecast(self, key, steps):
+        return self._recall(self._forecasts, (key, steps), '{}.{}.forecast.npz'.format(key, steps),
+                            lambda f: f['forecast'])
+
+    def set_forecast(self, key, steps, values):
+        self._remember(self._forecasts, (key, steps), values)
+        self._save('{}.{}.forecast.npz'.format(key, steps), forecast=values)
+
+
+forecast_cache = ForecastCache()  # shared in-memory cache used by default
+
+
+def _refit(endog, order, params):
+    """
+    Fits known order starting from known parameters
+    :return: fitted model or None if fit fails
+    """
+    from statsmodels.tsa.arima_model import ARIMA
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return ARIMA(endog, order, exog=None).fit(start_params=params, disp=0, solver='bfgs', maxiter=5000)
+    except Exception:
+        return None
+
+
+def _fit_forecast(x, steps, known=None, workers=1):
+    """
+    Fits ARIMA on x without last `steps` values and replaces them with forecast
+    :param known: (order, params) from cache; order search is skipped if its refit succeeds
+    :return: (forecast, order, params)
+    """
+    mod = _refit(x[:-steps], *known) if known is not None else None
+    if mod is None:
+        order, mod = _choose_order(x[:-steps], workers)
+    else:
+        order = known[0]
 
     t = mod.forecast(steps)[0]
 
@@ -40,4 +199,51 @@ def forecast(x, steps):
         forecast_res[k] = x[k]
     for k in range(x.shape[0] - steps, x.shape[0]):
         forecast_res[k] = t[k - x.shape[0] + steps]
-    return forecast_res
+    return forecast_res, order, mod.params
+
+
+def forecast(x, steps, workers=1, cache=None):
+    """
+    Replaces last `steps` values of x with forecast of ARIMA fitted on the rest.
+    Repeated calls are served from cache; a new horizon for known series reuses its order and parameters
+    instead of running the order search again.
+    :param cache: ForecastCache, forecast_cache by default
+    """
+    forecasts, errors = forecast_many([x], steps, cache=cache, workers=workers)
+    if errors:
+        raise errors[0][1]
+    return forecasts[0]
+
+
+def forecast_many(series, steps, executor=None, cache=None, workers=1):
+    """
+    Forecasts independent series, concurrently if executor is given.
+    Cache is read and updated in the calling process, executor only fits models.
+    :param series: list of 1-d arrays
+    :param executor: concurrent.futures executor or None to fit one by one
+    :param cache: ForecastCache, forecast_cache by default
+    :param workers: processes for order search of every series
+    :return: forecasts in order of series (None for failed ones), list of (index, exception) of failed series
+    """
+    cache = forecast_cache if cache is None else cache
+    forecasts = [None] * len(series)
+    errors = list()
+    pending = list()
+    for i, x in enumerate(series):
+        key = series_key(x)
+        cached = cache.get_forecast(key, steps)
+        if cached is not None:
+            forecasts[i] = cached.copy()
+            continue
+        args = (x, steps, cache.get_model(key), workers)
+        pending.append((i, key, args, executor.submit(_fit_forecast, *args) if executor is not None else None))
+    for i, key, args, future in pending:
+        try:
+            forecast_res, order, params = future.result() if future is not None else _fit_forecast(*args)
+        except Exception as e:
+            errors.append((i, e))
+            continue
+        cache.set_model(key, order, params)
+        cache.set_forecast(key, steps, forecast_res.copy())
+        forecasts[i] = forecast_res
+    return forecasts, errors
@@ -1,4 +1,10 @@
 __author__ = 'strike'
+import os
+
+import numpy as np
+
+from .cache_files import cache_path, write_cache
+
 
 def read_data(filename = 'data_2.txt'):
     f = open(filename, 'r')
@@ -9,3 +15,24 @@ def read_data(filename = 'data_2.txt'):
     f.close()
     return data
 
+
+def load_data(filename, rows=None):
+    """
+    Reads whitespace separated matrix from text file.
+    Parsed matrix is saved to sidecar .npy cache, later loads memory-map it instead of parsing text again.
+    :param filename: path to text file
+    :param rows: number of first rows to return, all by default
+    :return: 2-d float ndarray (read-only memory map if cache is used)
+    """
+    cache = cache_path(filename, 'npy')
+    if os.path.exists(cache):
+        data = np.load(cache, mmap_mode='r')
+    else:
+        data = np.loadtxt(filename, dtype=float, ndmin=2)
+        if write_cache(cache, lambda f: np.save(f, data)):
+            data = np.load(cache, mmap_mode='r')
+    if rows is not None:
+        if data.shape[0] < rows:
+            raise ValueError('{} has only {} rows, {} requested'.format(filename, data.shape[0], rows))
+        data = data[:rows]
+    return data
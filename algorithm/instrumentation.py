@@ -0,0 +1,74 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+__author__ = 'vlad'
+
+
+class StageStats(object):
+    """
+    Resources spent by one stage of fitting
+    """
+    FIELDS = ('wall_time', 'cpu_time', 'peak_memory', 'solver_calls')
+
+    def __init__(self, name, wall_time, cpu_time, peak_memory, solver_calls):
+        self.name = name
+        self.wall_time = wall_time  # seconds
+        self.cpu_time = cpu_time  # seconds of all threads of the process
+        self.peak_memory = peak_memory  # bytes allocated above the level at the start of stage
+        self.solver_calls = solver_calls  # calls of Solve._minimize_equation(s)
+
+    def as_dict(self):
+        return dict(name=self.name, **{field: getattr(self, field) for field in self.FIELDS})
+
+
+class StageProfile(object):
+    """
+    Per-stage wall time, CPU time, peak allocated memory and number of least squares solutions.
+    Memory is traced with tracemalloc, it slows fitting down, so profile is collected only when asked for.
+    """
+
+    def __init__(self):
+        self.stages = list()
+
+    @contextmanager
+    def measure(self, name, solver):
+        """
+        Records resources spent inside the block as stage `name` of `solver`
+        """
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        memory = tracemalloc.get_traced_memory()[0]
+        calls = solver.solver_calls
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            peak = tracemalloc.get_traced_memory()[1] - memory
+            if started_tracing:
+                tracemalloc.stop()
+            self.stages.append(StageStats(name, wall, cpu, peak, solver.solver_calls - calls))
+
+    def total(self, field):
+        if field == 'peak_memory':
+            return max([getattr(stage, field) for stage in self.stages] or [0])
+        return sum(getattr(stage, field) for stage in self.stages)
+
+    def as_dicts(self):
+        return [stage.as_dict() for stage in self.stages]
+
+    def as_table(self):
+        """
+        :return: (row names, column names, rows of values) with times in seconds and memory in MiB
+        """
+        scale = dict(peak_memory=2 ** -20)
+        rows = [[getattr(stage, field) * scale.get(field, 1) for field in StageStats.FIELDS] for stage in self.stages]
+        return [stage.name for stage in self.stages], list(StageStats.FIELDS), rows
+
+    def log_line(self):
+        return '; '.join('{0} {1:.4f}s cpu {2:.4f}s mem {3:.2f}MiB solves {4}'.format(
+            stage.name, stage.wall_time, stage.cpu_time, stage.peak_memory * 2 ** -20, stage.solver_calls)
+                         for stage in self.stages)
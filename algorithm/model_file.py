@@ -0,0 +1,85 @@
+"""
+Compact file of fitted model.
+
+Layout: magic, little-endian uint32 length of JSON header, JSON header, then arrays one after another
+in C order, every one aligned to 8 bytes. Header has structure class, poly_type, dimensions, degrees,
+dtype and for every array its offset (in bytes after header), shape and type.
+Arrays are memory-mapped on load, so loading does not depend on model size and needs no training data.
+"""
+import json
+import struct
+
+import numpy as np
+
+from .scaling import MinMaxScaler
+
+__author__ = 'vlad'
+
+MAGIC = b'SAMODEL1'
+ARRAYS = ('Lamb', 'a', 'c', 'scaler_min', 'scaler_max')
+
+
+def _structures():
+    from .solve import Solve
+    from .solve_custom import SolveExpTh, SolveExpTh1
+    return {cls.__name__: cls for cls in (Solve, SolveExpTh, SolveExpTh1)}
+
+
+def save_model(solver, filename):
+    """
+    :param solver: fitted Solve or its subclass (prepare() is done)
+    :param filename: path of model file
+    """
+    if type(solver).__name__ not in _structures():
+        raise ValueError('Unknown structure: ' + type(solver).__name__)
+    arrays = dict(Lamb=solver.Lamb, a=solver.a, c=solver.c, scaler_min=solver.scaler.min, scaler_max=solver.scaler.max)
+    # coefficients keep the type they were fitted in, so loaded model predicts exactly as the fitted one
+    arrays = {name: np.ascontiguousarray(value, dtype=np.asarray(value).dtype.newbyteorder('<'))
+              for name, value in arrays.items()}
+    layout = dict()
+    offset = 0
+    for name in ARRAYS:
+        layout[name] = [offset, list(arrays[name].shape), arrays[name].dtype.str]
+        offset += arrays[name].nbytes + (-arrays[name].nbytes % 8)
+    header = dict(structure=type(solver).__name__, poly_type=solver.poly_type, dimensions=list(solver.dim),
+                  degrees=[d - 1 for d in solver.deg], dtype=solver.dtype.name, samples=solver.n, arrays=layout)
+    header = json.dumps(header).encode('utf8')
+    start = len(MAGIC) + 4 + len(header)
+    with open(filename, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(b'\0' * (-start % 8))  # arrays are aligned for memory mapping
+        for name in ARRAYS:
+            f.write(arrays[name].tobytes())
+            f.write(b'\0' * (-arrays[name].nbytes % 8))
+
+
+def load_model(filename):
+    """
+    :param filename: path of file written by save_model (or Solve.save_model)
+    :return: solver of saved structure ready for predict() and calculate_value(); its arrays are read-only memory maps
+    """
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not a model file'.format(filename))
+        size, = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(size).decode('utf8'))
+    start = len(MAGIC) + 4 + size
+    start += -start % 8
+    data = np.memmap(filename, dtype=np.uint8, mode='r', offset=start)
+    arrays = dict()
+    for name, (offset, shape, dtype) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        arrays[name] = data[offset:offset + int(np.prod(shape)) * dtype.itemsize].view(dtype).reshape(shape)
+
+    cls = _structures()[header['structure']]
+    solver = cls(dict(samples=header['samples'], dimensions=header['dimensions'], degrees=header['degrees'],
+                      poly_type=header['poly_type'], dtype=header['dtype'], input_file='', output_file='',
+                      weights='average', lambda_multiblock=False))
+    solver.dim_integral = [sum(solver.dim[:i + 1]) for i in range(len(solver.dim))]
+    solver.scaler = MinMaxScaler.from_stats(arrays['scaler_min'], arrays['scaler_max'])
+    solver._define_columns()
+    solver.poly_func()
+    solver.Lamb, solver.a, solver.c = arrays['Lamb'], arrays['a'], arrays['c']
+    return solver
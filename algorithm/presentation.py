@@ -1,10 +1,11 @@
 import numpy as np
-import matplotlib.pyplot as plt
 from numpy.polynomial import Polynomial as pnm
 from os import name as os_name
 
 from .solve import Solve
+from .solve_custom import SolveExpTh, SolveExpTh1
 from .basis_generator import *
+from .compiled import CompiledModel
 
 __author__ = 'vlad'
 
@@ -12,27 +13,26 @@ __author__ = 'vlad'
 class PolynomialBuilder(object):
     def __init__(self, solution):
         assert isinstance(solution, Solve)
-        self._solution = solution
-        max_degree = max(solution.deg) - 1
+        self._structure = type(solution)
+        self._solution = solution.matrices  # formulas and plots are written for np.matrix attributes
         if solution.poly_type == 'cheb_t':
             self.symbol = 'T'
-            self.basis = basis_chebyshev(max_degree)
         elif solution.poly_type == 'sh_cheb_t':
             self.symbol = 'T*'
-            self.basis = basis_sh_chebyshev(max_degree)
         elif solution.poly_type == 'cheb_u':
             self.symbol = 'U'
-            self.basis = basis_sh_chebyshev_2(max_degree)
         elif solution.poly_type == 'sh_cheb_u':
             self.symbol = 'U*'
-            self.basis = basis_sh_chebyshev_2(max_degree)
         assert self.symbol
+        # the same polynomials the solution was fitted with
+        self.family = basis_family(solution.poly_type)
+        self.basis = self.family.polynomials(max(solution.deg))
         self.a = solution.a.T.tolist()
         self.c = solution.c.T.tolist()
-        self.minX = [X.min(axis=0).getA1() for X in solution.X_]
-        self.maxX = [X.max(axis=0).getA1() for X in solution.X_]
-        self.minY = solution.Y_.min(axis=0).getA1()
-        self.maxY = solution.Y_.max(axis=0).getA1()
+        self.minX = np.split(solution.scaler.min[solution.x_columns], solution.dim_integral[:2])
+        self.maxX = np.split(solution.scaler.max[solution.x_columns], solution.dim_integral[:2])
+        self.minY = solution.scaler.min[solution.y_columns]
+        self.maxY = solution.scaler.max[solution.y_columns]
 
     def _form_lamb_lists(self):
         """
@@ -144,6 +144,24 @@ class PolynomialBuilder(object):
         strings.insert(0, str((self.maxY[i] - self.minY[i]) * (1 + self.basis[0].coef[0]) ** (power_sum)))
         return ' * '.join(strings) + ' + ' + str((2 * self.minY[i] - self.maxY[i]))
 
+    def compile(self):
+        """
+        Builds numeric evaluator of recovered F: basis polynomials in power basis evaluated by Horner's scheme,
+        weights of the structure and denormalization of Y
+        :return: CompiledModel, its predict(X) gives the same as Solve.predict(X)
+        """
+        solution = self._solution
+        bases = [self.family.coefficients(degree) for degree in solution.deg[:3]]
+        if issubclass(self._structure, SolveExpTh):
+            transform = 'tanh'
+        elif issubclass(self._structure, SolveExpTh1):
+            transform = 'arctan'
+        else:
+            transform = 'log'
+        x_min, x_max = np.concatenate(self.minX), np.concatenate(self.maxX)
+        return CompiledModel(bases, solution.dim, x_min, x_max - x_min, np.asarray(solution.Lamb),
+                             np.asarray(solution.a), np.asarray(solution.c), self.minY, self.maxY - self.minY, transform)
+
     def get_results(self):
         """
         Generates results based on given solution
@@ -170,6 +188,7 @@ class PolynomialBuilder(object):
         return '\n'.join(psi_strings + phi_strings + f_strings + f_strings_transformed + f_strings_transformed_denormed)
 
     def plot_graphs(self):
+        import matplotlib.pyplot as plt  # imported on first plot, it is slow to load
         fig, axes = plt.subplots(2, self._solution.Y.shape[1])
         if self._solution.Y.shape[1] == 1:
             axes[0] = [axes[0]]
@@ -202,6 +221,7 @@ class PolynomialBuilder(object):
             plt.show()
 
     def compare_vals(self, name, real, predicted, reconstructed=None):
+        import matplotlib.pyplot as plt
         fig = plt.figure()
         axes = plt.axes()
         r = np.arange(len(real))
@@ -209,7 +229,7 @@ class PolynomialBuilder(object):
         axes.set_xlim(0, len(real))
         axes.grid()
         axes.plot(r, predicted, label='predicted')
-        if reconstructed != None:
+        if reconstructed is not None:
             axes.plot(r, reconstructed, label='reconstructed')
         axes.plot(r, real, label='real')
         axes.legend(loc='upper right', fontsize=16)
@@ -0,0 +1,44 @@
+import numpy as np
+
+
+class MinMaxScaler(object):
+    """
+    Column minimums and maximums of data, computed once in a single pass.
+    Maps columns to [0, 1] and back.
+    """
+
+    def __init__(self, data):
+        data = np.asarray(data)
+        self.min = data.min(axis=0)
+        self.max = data.max(axis=0)
+        self.span = self.max - self.min
+
+    @classmethod
+    def from_stats(cls, minimum, maximum):
+        """
+        Restores scaler from saved column minimums and maximums
+        """
+        scaler = cls.__new__(cls)
+        scaler.min = minimum
+        scaler.max = maximum
+        scaler.span = maximum - minimum
+        return scaler
+
+    def normalize(self, values, columns=slice(None), dtype=None):
+        """
+        :param values: rows of values for selected columns
+        :param columns: slice of columns the values belong to
+        :param dtype: type of result, float64 by default
+        :return: ndarray with values in [0, 1]
+        """
+        result = np.subtract(values, self.min[columns], dtype=dtype)
+        result /= self.span[columns]  # in place, only the result is allocated
+        return result
+
+    def denormalize(self, values, columns=slice(None)):
+        """
+        :param values: rows of normalized values for selected columns
+        :param columns: slice of columns the values belong to
+        :return: ndarray in original units
+        """
+        return np.asarray(values) * self.span[columns] + self.min[columns]
@@ -1,18 +1,65 @@
-from copy import deepcopy
+import logging
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import matplotlib.pyplot as plt
-from .forecast_arima import forecast
-from scipy import special
-from openpyxl import Workbook
-from tabulate import tabulate as tb
+from .forecast_arima import forecast_many, ForecastCache
 
 from .system_solve import *
+from .input_data import load_data
+from .scaling import MinMaxScaler
+from .instrumentation import StageProfile
+from .basis_generator import basis_family
+
+
+logger = logging.getLogger(__name__)
+
+
+def _unique_columns(B):
+    """
+    Like np.unique(B, axis=1, return_inverse=True), but without sorting of whole columns, which is slow for long ones
+    :return: (distinct columns in order of first appearance, index of distinct column for every column of B)
+    """
+    kept = list()
+    inverse = np.empty(B.shape[1], dtype=int)
+    for i in range(B.shape[1]):
+        for j, k in enumerate(kept):
+            if np.array_equal(B[:, i], B[:, k]):
+                inverse[i] = j
+                break
+        else:
+            inverse[i] = len(kept)
+            kept.append(i)
+    return B[:, kept], inverse
+
+
+class MatrixView(object):
+    """
+    Read-only view of solver for code written for np.matrix attributes.
+    2-d arrays (also inside lists) are returned as np.matrix views without copying, anything else as is.
+    """
+
+    def __init__(self, solver):
+        self._solver = solver
+
+    def __getattr__(self, name):
+        value = getattr(self._solver, name)
+        if isinstance(value, np.ndarray) and value.ndim == 2:
+            return np.asmatrix(value)
+        if isinstance(value, list) and value and all(isinstance(v, np.ndarray) and v.ndim == 2 for v in value):
+            return [np.asmatrix(v) for v in value]
+        return value
 
 
 class Solve(object):
     OFFSET = 1e-10
+    FALLBACK_SOLVER = 'cjg2'
+    # matrices save_to_file can write, in order of the workbook
+    EXPORT_SECTIONS = ('X', 'Y', 'X_norm', 'Y_norm', 'B', 'A', 'Lambda', 'Psi', 'a', 'Fi', 'c', 'F', 'F_',
+                       'norm_error', 'error')
 
     def __init__(self, d):
+        self.params = d
         self.n = d['samples']
         self.dim = d['dimensions']
         self.filename_input = d['input_file']
@@ -21,49 +68,88 @@ class Solve(object):
         self.weights = d['weights']
         self.poly_type = d['poly_type']
         self.splitted_lambdas = d['lambda_multiblock']
+        self.solver = d.get('solver', 'svd')  # name of backend in system_solve.SOLVERS
+        if self.solver not in SOLVERS:
+            raise ValueError('Unknown solver: {}, available: {}'.format(self.solver, ', '.join(sorted(SOLVERS))))
+        self.dtype = np.dtype(d.get('dtype', 'float64'))  # of normalized data and all matrices; float32 halves memory
+        # forecasts are cached in memory, and also in this directory if it is given
+        self.forecast_cache = ForecastCache(directory=d['forecast_cache_dir']) if d.get('forecast_cache_dir') else None
+        self.export_sections = d.get('export_sections', self.EXPORT_SECTIONS)  # what save_to_file writes
+        self.forecast_workers = d.get('forecast_workers', 1)  # processes forecasting X components concurrently
+        self.forecast_errors = list()
         self.norm_error = 0.0
         self.eps = 1E-8
         self.error = 0.0
         self.norm_error_a=0.0
         self.error_a=0.0
+        self._basis_cache = None
+        self._factorizations = dict()
+        self.solver_log = list()
+        self.solver_calls = 0  # calls of _minimize_equations during life of solver, fallbacks included
+        self.instrument = d.get('instrument', False)  # collect StageProfile in prepare()
+        self.stage_profile = None
 
     def define_data(self):
-        f = open(self.filename_input, 'r')
-        # all data from file_input in float
-        self.datas = [list(map(lambda x: float(x), f.readline().split())) for i in range(self.n)]
-        self.datas = np.matrix(self.datas)
+        # all data from file_input in float, memory-mapped from binary cache after first load
+        self.datas = load_data(self.filename_input, self.n)
         # list of sum degrees [ 3,1,2] -> [3,4,6]
         self.dim_integral = [sum(self.dim[:i + 1]) for i in range(len(self.dim))]
 
-    def _minimize_equation(self, A, b, type='cjg2'):
+    def _minimize_equation(self, A, b, type=None):
         """
         Finds such vector x that |Ax-b|->min.
         :param A: Matrix A
         :param b: Vector b
+        :param type: name of backend in SOLVERS, self.solver by default
         :return: Vector x
         """
-        if type == 'lsq':
-            return np.linalg.lstsq(A, b)[0]
-        elif type == 'cjg':
-            return conjugate_gradient_method(A.T * A, A.T * b, self.eps)
-        elif type == 'cjg2':
-            return conjugate_gradient_method_v2(A.T * A, A.T * b, self.eps)
-        elif type == 'cjg3':
-            return conjugate_gradient_method_v3(A.T * A, A.T * b, self.eps)
+        b = np.asarray(b)
+        return self._minimize_equations(A, b.reshape(b.shape[0], -1), type)
+
+    def _minimize_equations(self, A, B, type=None):
+        """
+        Finds such matrix X that |AX-B|->min for all columns of B with one factorization of A.
+        Factorizations are reused until next built_A, equal columns of B are solved once.
+        Every call is recorded in self.solver_log (backend, sizes, factorization and solution time).
+        Badly conditioned A falls back to FALLBACK_SOLVER, non-finite A or B is an error of the fit itself.
+        :param A: Matrix A
+        :param B: Matrix B, column per right-hand side
+        :param type: name of backend in SOLVERS, self.solver by default
+        :return: ndarray X
+        """
+        self.solver_calls += 1
+        backend = SOLVERS[type or self.solver]
+        A = np.asarray(A)
+        B = np.asarray(B)
+        if not (np.isfinite(A).all() and np.isfinite(B).all()):
+            # i.e. basis values below -1 make log(1 + A) nan; no backend gives a meaningful solution of such system
+            raise ValueError('System {}x{} has non-finite values in {}, check poly_type and degrees'.format(
+                A.shape[0], A.shape[1], 'A' if not np.isfinite(A).all() else 'B'))
+        unique, inverse = _unique_columns(B)
+        # A is stored together with its factorization, so its memory and the key can't be reused meanwhile
+        key = (backend.name, A.__array_interface__['data'][0], A.shape, A.strides)
+        cached = key in self._factorizations
+        start = time.perf_counter()
+        try:
+            if not cached:
+                self._factorizations[key] = (A, backend.factorize(A))
+            factorized = time.perf_counter()
+            X = backend.solve(self._factorizations[key][1], unique)
+        except (ValueError, np.linalg.LinAlgError):  # i.e. not positive definite A.T*A for cholesky, no convergence
+            if backend.name == self.FALLBACK_SOLVER:
+                raise
+            return self._minimize_equations(A, B, self.FALLBACK_SOLVER)
+        self.solver_log.append(dict(backend=backend.name, shape=A.shape, rhs=unique.shape[1], cached=cached,
+                                    factorize_time=factorized - start, solve_time=time.perf_counter() - factorized))
+        return X[:, inverse].astype(self.dtype, copy=False)
 
     def norm_data(self):
         """
         norm vectors value to value in [0,1]
         :return: float number in [0,1]
         """
-        n, m = self.datas.shape
-        vec = np.ndarray(shape=(n, m), dtype=float)
-        for j in range(m):
-            minv = np.min(self.datas[:, j])
-            maxv = np.max(self.datas[:, j])
-            for i in range(n):
-                vec[i, j] = (self.datas[i, j] - minv) / (maxv - minv)
-        self.data = np.matrix(vec)
+        self.scaler = MinMaxScaler(self.datas)
+        self.data = self.scaler.normalize(self.datas, dtype=self.dtype)
 
     def define_norm_vectors(self):
         """
@@ -75,17 +161,27 @@ class Solve(object):
         X3 = self.data[:, self.dim_integral[1]:self.dim_integral[2]]
         # matrix of vectors i.e.X = [[X11,X12],[X21],...]
         self.X = [X1, X2, X3]
-        self.minX = np.min(self.datas[:, :self.dim_integral[2]].A, axis=0)
-        self.maxX = np.max(self.datas[:, :self.dim_integral[2]].A, axis=0)
-        self.minY = np.min(self.datas[:, self.dim_integral[2]:].A, axis=0)
-        self.maxY = np.max(self.datas[:, self.dim_integral[2]:].A, axis=0)
-        # number columns in matrix X
-        self.mX = self.dim_integral[2]
+        self._define_columns()
         # matrix, that consists of i.e. Y1,Y2
         self.Y = self.data[:, self.dim_integral[2]:self.dim_integral[3]]
         self.Y_ = self.datas[:, self.dim_integral[2]:self.dim_integral[3]]
         self.X_ = [self.datas[:, :self.dim_integral[0]], self.datas[:, self.dim_integral[0]:self.dim_integral[1]],
                    self.datas[:, self.dim_integral[1]:self.dim_integral[2]]]
+        self._basis_cache = None  # basis of the previous X is not valid any more
+
+    def _define_columns(self):
+        """
+        Layout of X and Y columns and their scaling statistics, everything predict() needs besides coefficients
+        """
+        self.minX = self.scaler.min[:self.dim_integral[2]]
+        self.maxX = self.scaler.max[:self.dim_integral[2]]
+        self.minY = self.scaler.min[self.dim_integral[2]:]
+        self.maxY = self.scaler.max[self.dim_integral[2]:]
+        # number columns in matrix X
+        self.mX = self.dim_integral[2]
+        # columns of X and Y in data, to select statistics of scaler
+        self.x_columns = slice(0, self.dim_integral[2])
+        self.y_columns = slice(self.dim_integral[2], self.dim_integral[3])
 
     def built_B(self):
         def B_average():
@@ -93,7 +189,7 @@ class Solve(object):
             Vector B as average of max and min in Y. B[i] =max Y[i,:]
             :return:
             """
-            b = np.tile((self.Y.max(axis=1) + self.Y.min(axis=1)) / 2, (1, self.dim[3]))
+            b = np.tile((self.Y.max(axis=1, keepdims=True) + self.Y.min(axis=1, keepdims=True)) / 2, (1, self.dim[3]))
             return b
 
         def B_scaled():
@@ -101,132 +197,140 @@ class Solve(object):
             Vector B  = Y
             :return:
             """
-            return deepcopy(self.Y)
+            return self.Y.copy()
 
         if self.weights == 'average':
             self.B = B_average()
         elif self.weights == 'scaled':
             self.B = B_scaled()
         else:
-            exit('B not defined')
+            raise ValueError('Unknown weights: {}, expected average or scaled'.format(self.weights))
         self.B_log = np.log(self.B + 1 + self.OFFSET)
 
     def poly_func(self):
         """
-        Define function to polynomials
-        :return: function
-        """
-	#Shifted Chebyshev T
-        if self.poly_type == 'sh_cheb_t':
-            self.poly_f = special.eval_sh_chebyt
-	#Chebyshev T
-        elif self.poly_type == 'cheb_t':
-            self.poly_f = special.eval_chebyt
-	#Chebyshev U
-        elif self.poly_type == 'cheb_u':
-            self.poly_f = special.eval_chebyu
-	#Chebyshev Shifted U
-        elif self.poly_type == 'sh_cheb_u':
-            self.poly_f = special.eval_sh_chebyt
-        elif self.poly_type == 'cos':
-            self.poly_f = lambda deg, x: (np.cos(x) + np.pi) / (2 * np.pi)
-        elif self.poly_type == 'arctg':
-            self.poly_f = lambda deg, x: (np.arctan(x) + np.pi / 2) / np.pi
+        Define function to polynomials: poly_f(deg, x) - one function, poly_eval(x, count) - values of all of them
+        """
+        family = basis_family(self.poly_type)
+        self.poly_f = family.value
+        self.poly_eval = family.evaluate
 
     def built_A(self):
         """
-        built matrix A on shifted polynomials Chebysheva
-        :param self.p:mas of deg for vector X1,X2,X3 i.e.
+        built matrix A on basis polynomials
+        :param self.deg:mas of deg for vector X1,X2,X3 i.e.
         :param self.X: it is matrix that has vectors X1 - X3 for example
-        :return: matrix A as ndarray
+        :return: matrix A and A_log
         """
+        if self._basis_cache is not None and all(d <= m for d, m in zip(self.deg, self._basis_cache[0])):
+            A, A_log = self._slice_basis_cache()
+        else:
+            A, A_log = self._transform_A(self._basis_matrix())
+        self.A = A
+        self.A_log = A_log
+        self._factorizations = dict()
+        self.solver_log = list()
 
-        def mA():
-            """
-            :param X: [X1, X2, X3]
-            :param p: [p1,p2,p3]
-            :return: m = m1*p1+m2*p2+...
-            """
-            m = 0
-            for i in range(len(self.X)):
-                m += self.X[i].shape[1] * (self.deg[i] + 1)
-            return m
-
-        def coordinate(v, deg):
-            """
-            :param v: vector
-            :param deg: chebyshev degree polynom
-            :return:column with chebyshev value of coordiate vector
-            """
-            c = np.ndarray(shape=(self.n, 1), dtype=float)
-            for i in range(self.n):
-                c[i, 0] = self.poly_f(deg, v[i])
-            return c
+    def _transform_A(self, A):
+        """
+        :param A: basis values
+        :return: A and A_log of this structure
+        """
+        return A, np.log(A + 1 + self.OFFSET)
 
-        def vector(vec, p):
-            """
-            :param vec: it is X that consist of X11, X12, ... vectors
-            :param p: max degree for chebyshev polynom
-            :return: part of matrix A for vector X1
-            """
-            n, m = vec.shape
-            a = np.ndarray(shape=(n, 0), dtype=float)
-            for j in range(m):
-                for i in range(p):
-                    ch = coordinate(vec[:, j], i)
-                    a = np.append(a, ch, 1)
-            return a
-
-        # k = mA()
-        A = np.ndarray(shape=(self.n, 0), dtype=float)
+    def cache_basis(self, max_deg):
+        """
+        Computes A and A_log once for the largest degrees of a search, built_A then slices them
+        :param max_deg: [p1, p2, p3] largest numbers of polynomials (with 0 degree, as self.deg)
+        """
+        deg = self.deg
+        self.deg = list(max_deg)
+        try:
+            A, A_log = self._transform_A(self._basis_matrix())
+        finally:
+            self.deg = deg
+        self._basis_cache = (list(max_deg), np.asarray(A), np.asarray(A_log))
+
+    def _slice_basis_cache(self):
+        """
+        Selects columns of current degrees from the basis cache
+        :return: A and A_log; views of the cache when selected columns are contiguous
+        """
+        max_deg, A, A_log = self._basis_cache
+        cols = list()
+        start = 0
         for i in range(len(self.X)):
-            vec = vector(self.X[i], self.deg[i])
-            A = np.append(A, vec, 1)
-        self.A = np.matrix(A)
-        self.A_log = np.log(self.A + 1 + self.OFFSET)
+            for j in range(self.X[i].shape[1]):
+                cols.extend(range(start, start + self.deg[i]))
+                start += max_deg[i]
+        if cols == list(range(len(cols))):
+            return A[:, :len(cols)], A_log[:, :len(cols)]
+        return A[:, cols], A_log[:, cols]
+
+    def _basis_matrix(self, X=None):
+        """
+        Evaluates every degree for every X column in one vectorized pass per vector X1, X2, X3
+        :param X: [X1, X2, X3] normalized, self.X by default
+        :return: ndarray with shape (rows, m1*p1 + m2*p2 + m3*p3), columns ordered as X11 degrees, X12 degrees, ...
+        """
+        if X is None:
+            X = self.X
+        rows = X[0].shape[0]
+        widths = [X[i].shape[1] * self.deg[i] for i in range(len(X))]
+        A = np.empty(shape=(rows, sum(widths)), dtype=self.dtype)
+        start = 0
+        for i, width in enumerate(widths):
+            # reshape of the column slice is a view, so basis values are written straight into A
+            block = A[:, start:start + width].reshape(rows, X[i].shape[1], self.deg[i])
+            if block.dtype == np.float64:
+                self.poly_eval(np.asarray(X[i]), self.deg[i], out=block)
+            else:
+                # recurrence in single precision drifts below -1, and log(1 + A) of such values is nan
+                block[...] = self.poly_eval(np.asarray(X[i]), self.deg[i])
+            start += width
+        return A
 
     def lamb(self):
-        lamb = np.ndarray(shape=(self.A.shape[1], 0), dtype=float)
-        for i in range(self.dim[3]):
-            if self.splitted_lambdas:
-                boundary_1 = self.deg[0] * self.dim[0]
-                boundary_2 = self.deg[1] * self.dim[1] + boundary_1
-                lamb1 = self._minimize_equation(self.A_log[:, :boundary_1], self.B_log[:, i])
-                lamb2 = self._minimize_equation(self.A_log[:, boundary_1:boundary_2], self.B_log[:, i])
-                lamb3 = self._minimize_equation(self.A_log[:, boundary_2:], self.B_log[:, i])
-                lamb = np.append(lamb, np.concatenate((lamb1, lamb2, lamb3)), axis=1)
-            else:
-                lamb = np.append(lamb, self._minimize_equation(self.A_log, self.B_log[:, i]), axis=1)
-        self.Lamb = np.matrix(lamb)  # Lamb in full events
+        if self.splitted_lambdas:
+            boundary_1 = self.deg[0] * self.dim[0]
+            boundary_2 = self.deg[1] * self.dim[1] + boundary_1
+            lamb1 = self._minimize_equations(self.A_log[:, :boundary_1], self.B_log)
+            lamb2 = self._minimize_equations(self.A_log[:, boundary_1:boundary_2], self.B_log)
+            lamb3 = self._minimize_equations(self.A_log[:, boundary_2:], self.B_log)
+            lamb = np.concatenate((lamb1, lamb2, lamb3))
+        else:
+            lamb = self._minimize_equations(self.A_log, self.B_log)
+        self.Lamb = lamb  # Lamb in full events
+
+    def built_psi_log(self, A_log, Lamb):
+        """
+        Contracts A_log with Lamb for all components of X and all Y at once (one batched product per X1, X2, X3)
+        :param A_log: matrix with basis values, shape (rows, m1*p1 + m2*p2 + m3*p3)
+        :param Lamb: matrix of lambdas, column per Y
+        :return: ndarray with shape (dim[3], rows, mX); [i] is log psi for Y_i
+        """
+        A_log = np.asarray(A_log)
+        Lamb = np.asarray(Lamb)
+        rows = A_log.shape[0]
+        psi = np.empty(shape=(Lamb.shape[1], rows, sum(self.dim[:3])), dtype=np.result_type(A_log, Lamb))
+        q = 0  # iterator in lamb and A
+        l = 0  # iterator in columns psi
+        for k in range(3):  # choose X1 or X2 or X3
+            m, p = self.dim[k], self.deg[k]
+            a = A_log[:, q:q + m * p].reshape(rows, m, p).transpose(1, 0, 2)  # (component, row, degree)
+            lamb = Lamb[q:q + m * p].reshape(m, p, -1)  # (component, degree, Y)
+            psi[:, :, l:l + m] = np.matmul(a, lamb).transpose(2, 1, 0)
+            q += m * p
+            l += m
+        return psi
 
     def psi(self):
-        def built_psi(lamb):
-            """
-            return matrix xi1 for b1 as matrix
-            :param A:
-            :param lamb:
-            :param p:
-            :return: matrix psi, for each Y
-            """
-            psi = np.ndarray(shape=(self.n, self.mX), dtype=float)
-            q = 0  # iterator in lamb and A
-            l = 0  # iterator in columns psi
-            for k in range(len(self.X)):  # choose X1 or X2 or X3
-                for s in range(self.X[k].shape[1]):  # choose X11 or X12 or X13
-                    for i in range(self.X[k].shape[0]):
-                        psi[i, l] = self.A_log[i, q:q + self.deg[k]] * lamb[q:q + self.deg[k], 0]
-                    q += self.deg[k]
-                    l += 1
-            return np.matrix(psi)
-
-        self.Psi_log = []  # as list because psi[i] is matrix(not vector)
-        self.Psi = list()
-        for i in range(self.dim[3]):
-            self.Psi_log.append(built_psi(self.Lamb[:, i]))
-            self.Psi.append(np.exp(self.Psi_log[i]) - 1 - self.OFFSET)
+        psi_log = self.built_psi_log(self.A_log, self.Lamb)
+        self.Psi_log = list(psi_log)  # as list because psi[i] is matrix(not vector)
+        self.Psi = [np.exp(psi) - 1 - self.OFFSET for psi in self.Psi_log]
 
     def built_a(self):
-        self.a = np.ndarray(shape=(self.mX, 0), dtype=float)
+        self.a = np.ndarray(shape=(self.mX, 0), dtype=self.dtype)
         for i in range(self.dim[3]):
             a1 = self._minimize_equation(self.Psi_log[i][:, :self.dim_integral[0]],
                                          np.log(self.Y[:, i] + 1 + self.OFFSET))
@@ -238,6 +342,31 @@ class Solve(object):
             # self.a = np.append(self.a, temp, axis=1)
             self.a = np.append(self.a, np.vstack((a1, a2, a3)), axis=1)
 
+    def built_Fi_log(self, psi, a):
+        """
+        Weighted sums of psi over components of X1, X2, X3 for all Y at once
+        :param psi: ndarray (dim[3], rows, mX) with transformed psi for every Y
+        :param a: matrix a, column per Y
+        :return: ndarray (dim[3], rows, 3)
+        """
+        psi = np.asarray(psi)
+        a = np.asarray(a)
+        fi = np.empty(shape=psi.shape[:2] + (3,), dtype=np.result_type(psi, a))
+        k = 0  # point of beginning column to multiply
+        for j in range(3):
+            # matmul with stacked a: (Y, rows, m_j) x (Y, m_j, 1)
+            fi[:, :, j] = np.matmul(psi[:, :, k:k + self.dim[j]], a[k:k + self.dim[j]].T[:, :, np.newaxis])[:, :, 0]
+            k += self.dim[j]
+        return fi
+
+    def built_F_log(self, fi, c):
+        """
+        :param fi: ndarray (dim[3], rows, 3) with transformed Fi for every Y
+        :param c: matrix c, column per Y
+        :return: ndarray (rows, dim[3])
+        """
+        return np.einsum('irj,ji->ri', np.asarray(fi), np.asarray(c))
+
     def built_F1i(self, psi, a):
         """
         not use; it used in next function
@@ -246,139 +375,130 @@ class Solve(object):
         :param dim_integral:  = [3,4,6]//fibonacci of deg
         :return: matrix of (three) components with F1 F2 and F3
         """
-        m = len(self.X)  # m  = 3
-        F1i = np.ndarray(shape=(self.n, m), dtype=float)
-        k = 0  # point of beginning column to multiply
-        for j in range(m):  # 0 - 2
-            for i in range(self.n):  # 0 - 49
-                F1i[i, j] = psi[i, k:self.dim_integral[j]] * a[k:self.dim_integral[j], 0]
-            k = self.dim_integral[j]
-        return np.matrix(F1i)
+        return self.built_Fi_log(np.asarray(psi)[np.newaxis], a)[0]
 
     def built_Fi(self):
-        self.Fi_log = []
-        self.Fi = list()
-        for i in range(self.dim[3]):
-            self.Fi_log.append(self.built_F1i(self.Psi_log[i], self.a[:, i]))
-            self.Fi.append(np.exp(self.Fi_log[-1]) - 1 - self.OFFSET)
+        fi_log = self.built_Fi_log(self.Psi_log, self.a)
+        self.Fi_log = list(fi_log)
+        self.Fi = [np.exp(fi) - 1 - self.OFFSET for fi in self.Fi_log]
 
     def built_c(self):
-        self.c = np.ndarray(shape=(len(self.X), 0), dtype=float)
+        self.c = np.ndarray(shape=(len(self.X), 0), dtype=self.dtype)
         for i in range(self.dim[3]):
             self.c = np.append(self.c, self._minimize_equation(self.Fi_log[i], np.log(self.Y[:, i] + 1 + self.OFFSET))
                                , axis=1)
 
     def built_F(self):
-        F = np.ndarray(self.Y.shape, dtype=float)
-        for j in range(F.shape[1]):  # 2
-            for i in range(F.shape[0]):  # 50
-                F[i, j] = self.Fi_log[j][i, :] * self.c[:, j]
-        self.F_log = np.matrix(F)
+        self.F_log = self.built_F_log(self.Fi_log, self.c)
         self.F = np.exp(self.F_log) - 1
-        self.norm_error = []
-        self.norm_error_a = []
-        for i in range(self.Y.shape[1]):
-            self.norm_error.append(np.linalg.norm(self.Y[:, i] - self.F[:, i], np.inf))
-            self.norm_error_a.append(np.mean(self.Y[:,i] - self.F[:,i]))
-
-    def built_F_(self):
-        minY = self.Y_.min(axis=0)
-        maxY = self.Y_.max(axis=0)
-        self.F_ = np.multiply(self.F, maxY - minY) + minY
-        self.error = []
-        self.error_a = []
-        for i in range(self.Y_.shape[1]):
-            self.error.append(np.linalg.norm(self.Y_[:, i] - self.F_[:, i], np.inf))
-            self.error_a.append(np.mean(self.Y_[:,i] - self.F_[:,i]))
-
-    def save_to_file(self):
-        if self.filename_output == '':
-            return
-
-        wb = Workbook()
-        # get active worksheet
-        ws = wb.active
-
-        l = [None]
+        self._built_norm_error()
 
-        ws.append(['Введенные данные: X'])
-        for i in range(self.n):
-            ws.append(l + self.datas[i, :self.dim_integral[3]].tolist()[0])
-        ws.append([])
-
-        ws.append(['Введенные данные: Y'])
-        for i in range(self.n):
-            ws.append(l + self.datas[i, self.dim_integral[2]:self.dim_integral[3]].tolist()[0])
-        ws.append([])
-
-        ws.append(['X нормализованные:'])
-        for i in range(self.n):
-            ws.append(l + self.data[i, :self.dim_integral[2]].tolist()[0])
-        ws.append([])
-
-        ws.append(['Y нормализованные:'])
-        for i in range(self.n):
-            ws.append(l + self.data[i, self.dim_integral[2]:self.dim_integral[3]].tolist()[0])
-        ws.append([])
-
-        ws.append(['матр B:'])
-        for i in range(self.n):
-            ws.append(l + self.B[i].tolist()[0])
-        ws.append([])
-
-        ws.append(['матр A:'])
-        for i in range(self.A.shape[0]):
-            ws.append(l + self.A[i].tolist()[0])
-        ws.append([])
-
-        ws.append(['матр Lambda:'])
-        for i in range(self.Lamb.shape[0]):
-            ws.append(l + self.Lamb[i].tolist()[0])
-        ws.append([])
+    def _built_norm_error(self):
+        residual = self.Y - self.F
+        self.norm_error = np.abs(residual).max(axis=0).tolist()
+        self.norm_error_a = residual.mean(axis=0).tolist()
 
-        for j in range(len(self.Psi)):
-            s = 'матр Psi%i:' % (j + 1)
-            ws.append([s])
-            for i in range(self.n):
-                ws.append(l + self.Psi[j][i].tolist()[0])
-            ws.append([])
+    def built_F_(self):
+        self.F_ = self.scaler.denormalize(self.F, self.y_columns)
+        residual = self.Y_ - self.F_
+        self.error = np.abs(residual).max(axis=0).tolist()
+        self.error_a = residual.mean(axis=0).tolist()
 
-        ws.append(['матр a:'])
-        for i in range(self.mX):
-            ws.append(l + self.a[i].tolist()[0])
-        ws.append([])
+    def export_arrays(self, sections):
+        """
+        :param sections: names from EXPORT_SECTIONS
+        :return: list of (key, title, 2-d ndarray), Psi and Fi give one entry per block
+        """
+        unknown = set(sections) - set(self.EXPORT_SECTIONS)
+        if unknown:
+            raise ValueError('Unknown export sections: ' + ', '.join(sorted(unknown)))
+        arrays = []
+        for name in self.EXPORT_SECTIONS:
+            if name not in sections:
+                continue
+            if name in ('Psi', 'Fi'):
+                title = 'матр Psi%i:' if name == 'Psi' else 'матр F%i:'
+                for j, m in enumerate(getattr(self, name)):
+                    arrays.append(('%s%i' % (name, j + 1), title % (j + 1), np.asarray(m)))
+            else:
+                title, value = self._export_section(name)
+                arrays.append((name, title, np.atleast_2d(np.asarray(value))))
+        return arrays
+
+    def _export_section(self, name):
+        return {
+            'X': ('Введенные данные: X', self.datas[:, :self.dim_integral[3]]),
+            'Y': ('Введенные данные: Y', self.datas[:, self.dim_integral[2]:self.dim_integral[3]]),
+            'X_norm': ('X нормализованные:', self.data[:, :self.dim_integral[2]]),
+            'Y_norm': ('Y нормализованные:', self.data[:, self.dim_integral[2]:self.dim_integral[3]]),
+            'B': ('матр B:', self.B),
+            'A': ('матр A:', self.A),
+            'Lambda': ('матр Lambda:', self.Lamb),
+            'a': ('матр a:', self.a),
+            'c': ('матр c:', self.c),
+            'F': ('Y построенное нормализованное :', self.F),
+            'F_': ('Y построенное :', self.F_),
+            'norm_error': ('Нормализовная невязка(max) (Y - F)', self.norm_error),
+            'error': ('Невязка(max) (Y_ - F_))', self.error),
+        }[name]
+
+    def save_model(self, filename):
+        """
+        Writes fitted coefficients and scaling statistics to compact binary file, see model_file.load_model
+        """
+        from .model_file import save_model
+        save_model(self, filename)
 
-        for j in range(len(self.Fi)):
-            s = 'матр F%i:' % (j + 1)
-            ws.append([s])
-            for i in range(self.Fi[j].shape[0]):
-                ws.append(l + self.Fi[j][i].tolist()[0])
-            ws.append([])
+    def save_to_file(self, filename=None, sections=None):
+        """
+        Exports matrices of the fit. Format is chosen by extension:
+        .npz writes named arrays (Psi and Fi as Psi1, Psi2, ..., Fi1, ...), anything else a streamed xlsx workbook.
+        :param filename: output path, filename_output by default; nothing is written if it is empty
+        :param sections: names from EXPORT_SECTIONS to write, export_sections param (all by default) if None
+        """
+        filename = self.filename_output if filename is None else filename
+        if filename == '':
+            return
+        sections = self.export_sections if sections is None else sections
+        arrays = self.export_arrays(sections)
 
-        ws.append(['матр c:'])
-        for i in range(len(self.X)):
-            ws.append(l + self.c[i].tolist()[0])
-        ws.append([])
+        if filename.lower().endswith('.npz'):
+            np.savez(filename, **{key: value for key, title, value in arrays})
+            return
 
-        ws.append(['Y построенное нормализованное :'])
-        for i in range(self.n):
-            ws.append(l + self.F[i].tolist()[0])
-        ws.append([])
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)  # rows are streamed to file, workbook is not kept in memory
+        ws = wb.create_sheet()
 
-        ws.append(['Y построенное :'])
-        for i in range(self.n):
-            ws.append(l + self.F_[i].tolist()[0])
-        ws.append([])
+        l = [None]
+        for key, title, value in arrays:
+            ws.append([title])
+            for row in value.tolist():
+                ws.append(l + row)
+            if key not in ('norm_error', 'error'):
+                ws.append([])
 
-        ws.append(['Нормализовная невязка(max) (Y - F)'])
-        ws.append(l + self.norm_error)
+        wb.save(filename)
 
-        ws.append(['Невязка(max) (Y_ - F_))'])
-        ws.append(l + self.error)
+    def _tabulator(self, max_rows=None):
+        """
+        :return: tabulate-like function that cuts tables to max_rows rows
+        """
+        from tabulate import tabulate
 
-        wb.save(self.filename_output)
+        def table(rows):
+            if max_rows is None or len(rows) <= max_rows:
+                return tabulate(rows)
+            return tabulate(rows[:max_rows]) + '\n... {} more rows'.format(len(rows) - max_rows)
+        return table
 
-    def show(self):
+    def show(self, max_rows=None):
+        """
+        Formats report with all matrices of the fit
+        :param max_rows: tables are cut to their first max_rows rows, None keeps all rows
+        :return: text of report
+        """
+        tb = self._tabulator(max_rows)
         text = []
 
         text.append('Введенные данные: X')
@@ -438,67 +558,92 @@ class Solve(object):
 
         return '\n'.join(text)
 
-    def prepare(self):
-        self.define_data()
-        self.norm_data()
-        self.define_norm_vectors()
-        self.built_B()
-        self.poly_func()
-        self.built_A()
-        self.lamb()
-        self.psi()
-        self.built_a()
-        self.built_Fi()
-        self.built_c()
-        self.built_F()
-        self.built_F_()
-        self.show()
-        self.save_to_file()
+    # stages of prepare() in order of execution
+    STAGES = ('define_data', 'norm_data', 'define_norm_vectors', 'built_B', 'poly_func', 'built_A', 'lamb', 'psi',
+              'built_a', 'built_Fi', 'built_c', 'built_F', 'built_F_', 'save_to_file')
+
+    def prepare(self, progress=None, instrument=None):
+        """
+        Runs all stages of fitting
+        :param progress: callable(index, count, stage) called before every stage of STAGES;
+                         exception raised in it stops fitting (i.e. to cancel it)
+        :param instrument: collect resources of every stage to self.stage_profile, instrument param by default
+        """
+        instrument = self.instrument if instrument is None else instrument
+        self.stage_profile = StageProfile() if instrument else None
+        for index, stage in enumerate(self.STAGES):
+            if progress is not None:
+                progress(index, len(self.STAGES), stage)
+            if self.stage_profile is None:
+                getattr(self, stage)()
+            else:
+                with self.stage_profile.measure(stage, self):
+                    getattr(self, stage)()
+        if self.stage_profile is not None:
+            logger.info('%s stages: %s', type(self).__name__, self.stage_profile.log_line())
+
+    @property
+    def matrices(self):
+        """
+        :return: MatrixView of this solver, for code that expects np.matrix attributes
+        """
+        return MatrixView(self)
+
+    def _aggregate_inner(self, values):
+        """
+        Transform applied to values before they are weighted, the same as in fitting of the structure
+        """
+        return np.log(1 + values + self.OFFSET)
 
     def aggregate(self, values, coeffs):
-        return np.exp(np.dot(np.log(1 + values + self.OFFSET), coeffs)) - 1
+        return np.exp(np.dot(self._aggregate_inner(values), coeffs)) - 1
+
+    def predict(self, X):
+        """
+        Calculates Y for many input rows in one vectorized pass
+        :param X: array with shape (m, mX) in original units
+        :return: ndarray with shape (m, dim[3]) in original units
+        """
+        X = self.scaler.normalize(np.atleast_2d(np.asarray(X, dtype=float)), self.x_columns)
+        phi = self._basis_matrix(np.split(X, self.dim_integral[:2], axis=1))
+        psi = np.exp(self.built_psi_log(self._aggregate_inner(phi), self.Lamb)) - 1
+        big_phi = np.exp(self.built_Fi_log(self._aggregate_inner(psi), self.a)) - 1
+        result = np.exp(self.built_F_log(self._aggregate_inner(big_phi), self.c)) - 1
+        return self.scaler.denormalize(result, self.y_columns)
 
     def calculate_value(self, X):
-        def calculate_polynomials(value, deg_lim):  # deg_lim is not reached
-            return np.array([self.poly_f(deg, value) for deg in range(deg_lim)]).T
-
-        X = np.array(X)
-        X = (X - self.minX) / (self.maxX - self.minX)
-        X = np.split(X, self.dim_integral[:2])
-        phi = [calculate_polynomials(vector, self.deg[i]) for i, vector in enumerate(X)]
-        psi = list()
-        shift = 0
-        for i in range(3):
-            for j in range(self.dim[i]):
-                psi.append(self.aggregate(phi[i][j], self.Lamb.A[shift: shift + self.deg[i]]))
-                shift += self.deg[i]
-        psi = np.array(psi).T
-        big_phi = list()
-        for i in range(3):
-            big_phi.append([self.aggregate(psi[k, (self.dim_integral[i - 1] if i > 0 else 0): self.dim_integral[i]],
-                                           self.a.A[(self.dim_integral[i - 1] if i > 0 else 0):
-                                           self.dim_integral[i], k]) for k in range(self.dim[3])])
-        big_phi = np.array(big_phi).T
-        result = np.array([self.aggregate(big_phi[k], self.c.A[:, k]) for k in range(self.dim[3])])
-        result = result * (self.maxY - self.minY) + self.minY
-        return result
-
-    def build_predicted(self, steps):
-        XF = list()
-        for i, x in enumerate(self.X_):
-            xf = list()
-            for j, xc in enumerate(x.T):
-                xf.append(forecast(xc.getA1(), steps))
-            XF.append(xf)
-        yf = list()
-        for s in range(1, steps + 1):
-            x = list()
-            for xf in XF:
-                for xfc in xf:
-                    x.append(xfc[-s])
-            yf.append(self.calculate_value(x))
-        YF = self.Y_.copy().getA()
-        YF[-steps:] = np.array(yf)
+        return self.predict(np.asarray(X, dtype=float)[np.newaxis])[0]
+
+    def build_predicted(self, steps, executor=None):
+        """
+        Forecasts every X component with ARIMA and calculates Y on forecasted X for the last `steps` samples
+        :param executor: concurrent.futures executor for component forecasts;
+                         by default process pool of self.forecast_workers (serial if it is 1)
+        :return: XF - forecasted components as [X1, X2, X3] lists, YF - Y with predicted last rows
+        """
+        components = [(i, j, np.array(xc)) for i, x in enumerate(self.X_) for j, xc in enumerate(x.T)]
+        own_executor = executor is None and self.forecast_workers > 1
+        if own_executor:
+            executor = ProcessPoolExecutor(self.forecast_workers)
+        try:
+            forecasts, errors = forecast_many([xc for i, j, xc in components], steps, executor, self.forecast_cache)
+        finally:
+            if own_executor:
+                executor.shutdown()
+        self.forecast_errors = list()
+        for index, e in errors:
+            # failed component keeps its last known value, the rest of prediction goes on
+            i, j, xc = components[index]
+            forecasts[index] = np.concatenate((xc[:-steps], np.repeat(xc[-steps - 1], steps)))
+            self.forecast_errors.append(('X{}{}'.format(i + 1, j + 1), e))
+            warnings.warn('Forecast of X{}{} failed: {}'.format(i + 1, j + 1, e))
+        XF = [list() for x in self.X_]
+        for (i, j, xc), xf in zip(components, forecasts):
+            XF[i].append(xf)
+        # rows of predicted X for the last `steps` samples in chronological order
+        x = np.array([xfc[-steps:] for xf in XF for xfc in xf]).T
+        YF = np.array(self.Y_)
+        YF[-steps:] = self.predict(x)
         return XF, YF
 
 
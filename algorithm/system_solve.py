@@ -17,10 +17,10 @@ def conjugate_gradient_method(A, b, eps):
     while True:
         try:
             i+= 1
-            ai = float(vi.T*ri)/float(vi.T*A*vi) # alpha i
+            ai = (vi.T @ ri).item()/(vi.T @ A @ vi).item() # alpha i
             xi1 = xi+ai*vi # x i+1
-            ri1 = ri-ai*A*vi # r i+1
-            betai = -float(vi.T*A*ri1)/float(vi.T*A*vi) # beta i
+            ri1 = ri-ai*(A @ vi) # r i+1
+            betai = -(vi.T @ A @ ri1).item()/(vi.T @ A @ vi).item() # beta i
             vi1 = ri1+betai*vi
             xi,vi,ri = xi1,vi1,ri1
             if (np.linalg.norm(ri1,np.inf)<eps):
@@ -29,7 +29,7 @@ def conjugate_gradient_method(A, b, eps):
                 raise NameError('Over index: many iterations')
         except NameError:
             print("conjugate_gradient_method is in 1000 iteration")
-    return np.matrix(xi1)
+    return xi1
 
 def conjugate_gradient_method_v2(A, b, eps):
     '''
@@ -48,10 +48,10 @@ def conjugate_gradient_method_v2(A, b, eps):
     i = 0 #loop for number iteration
     while True:
         i+= 1
-        ai = float(vi.T*ri)/float(vi.T*A*vi) # alpha i
+        ai = (vi.T @ ri).item()/(vi.T @ A @ vi).item() # alpha i
         xi1 = xi+ai*vi # x i+1
-        ri1 = ri-ai*A*vi # r i+1
-        betai = -float(vi.T*A*ri1)/float(vi.T*A*vi) # beta i
+        ri1 = ri-ai*(A @ vi) # r i+1
+        betai = -(vi.T @ A @ ri1).item()/(vi.T @ A @ vi).item() # beta i
         vi1 = ri1+betai*vi
         xi,vi,ri = xi1,vi1,ri1
         resid_current_norm = np.linalg.norm(ri,np.inf)
@@ -60,7 +60,7 @@ def conjugate_gradient_method_v2(A, b, eps):
             x_best = xi
         if (resid_best_norm<eps) or i > 10 * n:
             break
-    return np.matrix(x_best)
+    return x_best
 
 def conjugate_gradient_method_v3(A, b, eps):
     '''
@@ -71,13 +71,148 @@ def conjugate_gradient_method_v3(A, b, eps):
     :return: solution x
     '''
     x = np.zeros((A.shape[0],1))
-    p = rnext = rcur = b - A * x
+    p = rnext = rcur = b - A @ x
     while np.linalg.norm(rcur) > eps:
         rcur = rnext
-        alpha = np.linalg.norm(rcur)**2 / float(p.T * A * p)
+        alpha = np.linalg.norm(rcur)**2 / (p.T @ A @ p).item()
         x = x + alpha * p
-        rnext = rcur - alpha * (A * p)
+        rnext = rcur - alpha * (A @ p)
         if np.linalg.norm(rnext) > eps:
             beta = np.linalg.norm(rnext)**2 / np.linalg.norm(rcur)**2
             p = rnext + beta * p
-    return np.matrix(x)
\ No newline at end of file
+    return x
+
+class LinearSolver(object):
+    """
+    Backend that finds X with |AX-B|->min.
+    factorize(A) is called once per matrix, solve(factor, B) then accepts any number of columns of B
+    """
+    name = None
+
+    def factorize(self, A):
+        return A
+
+    def solve(self, factor, B):
+        raise NotImplementedError
+
+
+SOLVERS = dict()
+
+
+def register_solver(cls):
+    """
+    Class decorator that adds backend to SOLVERS under its name
+    """
+    SOLVERS[cls.name] = cls()
+    return cls
+
+
+@register_solver
+class CholeskySolver(LinearSolver):
+    name = 'cholesky'
+
+    def factorize(self, A):
+        from scipy import linalg
+        return A, linalg.cho_factor(A.T.dot(A))
+
+    def solve(self, factor, B):
+        from scipy import linalg
+        A, cho = factor
+        return linalg.cho_solve(cho, A.T.dot(B))
+
+
+@register_solver
+class QRSolver(LinearSolver):
+    """
+    QR with column pivoting, columns beyond numerical rank of A get zero coefficients
+    (basic solution: for rank-deficient A it differs from the minimal norm one of svd and cjg*)
+    """
+    name = 'qr'
+
+    def factorize(self, A):
+        from scipy import linalg
+        q, r, perm = linalg.qr(A, mode='economic', pivoting=True)
+        diag = np.abs(np.diag(r))
+        rank = int(np.sum(diag > np.finfo(r.dtype).eps * max(A.shape) * (diag[0] if diag.size else 0)))
+        return q[:, :rank], r[:rank, :rank], perm[:rank], A.shape[1]
+
+    def solve(self, factor, B):
+        from scipy import linalg
+        q, r, perm, m = factor
+        X = np.zeros((m, B.shape[1]), dtype=r.dtype)
+        X[perm] = linalg.solve_triangular(r, q.T.dot(B))
+        return X
+
+
+@register_solver
+class SVDSolver(LinearSolver):
+    """
+    Minimal norm solution, the same conjugate gradient converges to from zero start
+    """
+    name = 'svd'
+
+    def factorize(self, A):
+        if A.dtype == np.float32:
+            # numpy computes float32 decompositions in double precision, scipy keeps single one
+            from scipy import linalg
+            u, s, vt = linalg.svd(A, full_matrices=False)
+        else:
+            u, s, vt = np.linalg.svd(A, full_matrices=False)
+        s_inv = np.zeros_like(s)
+        nonzero = s > np.finfo(s.dtype).eps * max(A.shape) * (s[0] if s.size else 0)
+        s_inv[nonzero] = 1 / s[nonzero]
+        return u, s_inv, vt
+
+    def solve(self, factor, B):
+        u, s_inv, vt = factor
+        return vt.T.dot(s_inv[:, np.newaxis] * u.T.dot(B))
+
+
+SOLVERS['lstsq'] = SOLVERS['svd']
+
+
+@register_solver
+class LSQRSolver(LinearSolver):
+    """
+    Matrix-free iterative solver, A.T*A is never formed
+    """
+    name = 'lsqr'
+    eps = 1E-10
+
+    def solve(self, factor, B):
+        from scipy.sparse import linalg as sparse_linalg
+        return np.column_stack([sparse_linalg.lsqr(factor, B[:, i], atol=self.eps, btol=self.eps)[0]
+                                for i in range(B.shape[1])])
+
+
+class _ConjugateGradientSolver(LinearSolver):
+    """
+    Legacy conjugate gradient methods on normal equations, A.T*A is formed once per matrix
+    """
+    method = None
+    eps = 1E-8
+
+    def factorize(self, A):
+        return A, A.T.dot(A)
+
+    def solve(self, factor, B):
+        A, AtA = factor
+        return np.hstack([self.method(AtA, A.T.dot(B[:, i:i + 1]), self.eps) for i in range(B.shape[1])])
+
+
+@register_solver
+class CJGSolver(_ConjugateGradientSolver):
+    name = 'cjg'
+    method = staticmethod(conjugate_gradient_method)
+
+
+@register_solver
+class CJG2Solver(_ConjugateGradientSolver):
+    name = 'cjg2'
+    method = staticmethod(conjugate_gradient_method_v2)
+
+
+@register_solver
+class CJG3Solver(_ConjugateGradientSolver):
+    name = 'cjg3'
+    method = staticmethod(conjugate_gradient_method_v3)
@@ -0,0 +1,43 @@
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, QVariant
+
+__author__ = 'vlad'
+
+
+class MatrixTableModel(QAbstractTableModel):
+    """
+    Read-only model of 2-d array for QTableView.
+    Cells are formatted only when the view asks for them, so only visible part of large matrix costs anything.
+    """
+
+    def __init__(self, values=None, parent=None):
+        super(MatrixTableModel, self).__init__(parent)
+        self._values = values
+        self._headers = {Qt.Vertical: None, Qt.Horizontal: None}
+
+    def set_values(self, values, row_names=None, column_names=None):
+        """
+        :param values: 2-d ndarray or None to clear the model
+        :param row_names: header of rows, numbers from 1 by default
+        :param column_names: header of columns, numbers from 1 by default
+        """
+        self.beginResetModel()
+        self._values = values
+        self._headers = {Qt.Vertical: row_names, Qt.Horizontal: column_names}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if self._values is None or parent.isValid() else self._values.shape[0]
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if self._values is None or parent.isValid() else self._values.shape[1]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return QVariant()
+        return '{:.6g}'.format(self._values[index.row(), index.column()])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        names = self._headers[orientation]
+        return str(section + 1) if names is None else names[section]
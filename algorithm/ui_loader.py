@@ -0,0 +1,35 @@
+import io
+import os
+
+from .cache_files import cache_path, write_cache
+
+
+def _compile(filename, cache):
+    from PyQt5 import uic
+    code = io.StringIO()
+    info = uic.compiler.UICompiler().compileUi(filename, code, False, '_rc', '.')
+    # names of generated classes are kept in the module, so cached form is loaded without parsing .ui again
+    code.write('\nUI_CLASS = {!r}\nUI_BASE = {!r}\n'.format(info['uiclass'], info['baseclass']))
+    source = code.getvalue()
+    write_cache(cache, lambda f: f.write(source), 'w')  # compiled on every start if it can't be cached
+    return source
+
+
+def load_ui_type(filename):
+    """
+    Drop-in replacement of PyQt5.uic.loadUiType.
+    Form is compiled to python once and cached next to .ui file, cache is rebuilt when .ui file changes.
+    :param filename: path to .ui file
+    :return: (form class, Qt base class)
+    """
+    from PyQt5 import QtWidgets
+    cache = cache_path(filename, 'py')
+    if os.path.exists(cache):
+        with open(cache, encoding='utf8') as f:
+            source = f.read()
+    else:
+        source = _compile(filename, cache)
+    ui_globals = {}
+    exec(compile(source, cache, 'exec'), ui_globals)
+    base = ui_globals.get(ui_globals['UI_BASE']) or getattr(QtWidgets, ui_globals['UI_BASE'])
+    return ui_globals[ui_globals['UI_CLASS']], base
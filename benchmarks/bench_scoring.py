@@ -0,0 +1,93 @@
+"""
+Throughput of scoring with fitted model: Solve.predict against CompiledModel of PolynomialBuilder.compile().
+
+    python -m benchmarks.bench_scoring --rows 100000
+
+Models are fitted on synthetic data, then scored on `rows` random points inside the training range.
+For every case prints rows per second of every evaluator and their largest relative difference from Solve.predict;
+exits with 1 if a difference is above tolerance (see precision in algorithm/compiled.py, it depends on degree).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from algorithm.presentation import PolynomialBuilder
+from algorithm.solve import Solve
+from algorithm.solve_custom import SolveExpTh
+from benchmarks.synthetic import write
+
+TOLERANCE = 1e-4  # relative, enough for the log structure up to degree 8
+
+# (samples, dimensions, degrees)
+CASES = [
+    (200, [2, 2, 3, 4], [3, 3, 3]),
+    (1000, [5, 5, 5, 5], [8, 8, 8]),
+]
+
+
+def _best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(cases=CASES, classes=(Solve, SolveExpTh), poly_type='sh_cheb_t', rows=100000, repeat=3, directory=None,
+        tolerance=TOLERANCE):
+    """
+    :return: list of records: case description, rows per second and largest relative difference of every evaluator,
+             agrees - whether all differences are within tolerance
+    """
+    if directory is None:
+        with tempfile.TemporaryDirectory(prefix='bench_') as directory:
+            return run(cases, classes, poly_type, rows, repeat, directory, tolerance)
+    records = []
+    for samples, dimensions, degrees in cases:
+        filename = write(os.path.join(directory, 'data_{}.txt'.format(samples)), samples, dimensions, degrees)
+        for cls in classes:
+            solver = cls(dict(input_file=filename, samples=samples, dimensions=dimensions, degrees=degrees,
+                              poly_type=poly_type, weights='average', lambda_multiblock=False, output_file=''))
+            solver.prepare()
+            model = PolynomialBuilder(solver).compile()
+            rng = np.random.RandomState(0)
+            X = solver.minX + (solver.maxX - solver.minX) * rng.uniform(size=(rows, solver.mX))
+            expected = solver.predict(X)
+            evaluators = dict(predict=solver.predict, compiled=model.predict,
+                              compiled_levels=lambda X: model.predict(X, collapsed=False))
+            record = dict(cls=cls.__name__, samples=samples, dimensions=dimensions, degrees=degrees, rows=rows)
+            for name, evaluate in evaluators.items():
+                record[name] = dict(rows_per_second=rows / _best_time(lambda: evaluate(X), repeat),
+                                    max_relative_difference=float(np.max(np.abs(evaluate(X) - expected) /
+                                                                         np.abs(expected))))
+            record['agrees'] = all(record[name]['max_relative_difference'] <= tolerance for name in evaluators)
+            records.append(record)
+            print('{cls} n={samples} dim={dimensions} deg={degrees}: '.format(**record) + ', '.join(
+                '{} {:.0f} rows/s (diff {:.1e})'.format(name, record[name]['rows_per_second'],
+                                                        record[name]['max_relative_difference'])
+                for name in evaluators))
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compares Solve.predict with compiled model')
+    parser.add_argument('--rows', type=int, default=100000, help='number of scored points')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--poly-type', default='sh_cheb_t')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed relative difference from predict')
+    args = parser.parse_args(argv)
+    records = run(rows=args.rows, repeat=args.repeat, poly_type=args.poly_type, tolerance=args.tolerance)
+    failed = [record for record in records if not record['agrees']]
+    for record in failed:
+        print('Disagreement above {}: {cls} n={samples} dim={dimensions} deg={degrees}'.format(
+            args.tolerance, **record))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
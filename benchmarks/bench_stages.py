@@ -0,0 +1,117 @@
+"""
+Times every stage of prepare() of Solve and SolveExpTh over a sweep of synthetic data sizes.
+
+    python -m benchmarks.bench_stages --output benchmarks/results/current.json
+    python -m benchmarks.bench_stages --output new.json --compare benchmarks/results/current.json
+
+Every case is run `repeat` times in the current process, the minimal time of every stage is recorded.
+Results file is JSON with one record per (class, samples, dimensions, degrees, poly_type).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from algorithm.batch import run_job
+from benchmarks.synthetic import write
+
+# (samples, dimensions, degrees)
+SWEEP = [
+    (50, [2, 2, 3, 4], [3, 3, 3]),
+    (200, [2, 2, 3, 4], [3, 3, 3]),
+    (1000, [2, 2, 3, 4], [5, 5, 5]),
+    (1000, [5, 5, 5, 5], [5, 5, 5]),
+    (5000, [5, 5, 5, 5], [8, 8, 8]),
+]
+CLASSES = ('Solve', 'SolveExpTh')
+
+
+def _key(record):
+    return record['class'], record['samples'], tuple(record['dimensions']), tuple(record['degrees']), \
+        record['poly_type']
+
+
+def run(sweep=SWEEP, classes=CLASSES, poly_type='sh_cheb_t', repeat=3, directory=None):
+    """
+    :param directory: where synthetic data is written, temporary directory removed afterwards by default
+    :return: list of records: case description, minimal time of every stage, total and norm error
+    """
+    if directory is None:
+        with tempfile.TemporaryDirectory(prefix='bench_') as directory:
+            return run(sweep, classes, poly_type, repeat, directory)
+    records = []
+    for samples, dimensions, degrees in sweep:
+        filename = os.path.join(directory, 'data_{}_{}_{}.txt'.format(
+            samples, '-'.join(map(str, dimensions)), '-'.join(map(str, degrees))))
+        write(filename, samples, dimensions, degrees)
+        for cls in classes:
+            job = dict(name=cls, input_file=filename, samples=samples, dimensions=dimensions, degrees=degrees,
+                       poly_type=poly_type, weights='average', lambda_multiblock=False, output_file='',
+                       custom_struct=cls == 'SolveExpTh')
+            runs = [run_job(job) for _ in range(repeat)]
+            failed = [r for r in runs if r['status'] != 'ok']
+            record = dict(samples=samples, dimensions=dimensions, degrees=degrees, poly_type=poly_type)
+            record['class'] = cls
+            if failed:
+                record.update(status='failed', message=failed[0]['message'])
+            else:
+                record.update(status='ok', norm_error=runs[0]['norm_error'],
+                              stages={stage: min(r['timings'][stage] for r in runs) for stage in runs[0]['timings']},
+                              total=min(r['total_time'] for r in runs))
+            records.append(record)
+            print('{class} n={samples} dim={dimensions} deg={degrees}: {0}'.format(
+                '{:.4f} s'.format(record['total']) if 'total' in record else record['status'], **record))
+    return records
+
+
+def compare(records, baseline, threshold=1.2):
+    """
+    :return: lines describing stages that are slower than in baseline by more than threshold times
+    """
+    base = {_key(r): r for r in baseline if r.get('status') == 'ok'}
+    lines = []
+    for record in records:
+        old = base.get(_key(record))
+        if old is None or record.get('status') != 'ok':
+            continue
+        for stage, t in sorted(record['stages'].items()):
+            # stages faster than a few milliseconds are too noisy to compare
+            if stage in old['stages'] and max(t, old['stages'][stage]) > 5e-3 and t > threshold * old['stages'][stage]:
+                lines.append('{} n={} dim={} deg={} {}: {:.4f} s -> {:.4f} s'.format(
+                    record['class'], record['samples'], record['dimensions'], record['degrees'], stage,
+                    old['stages'][stage], t))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Times stages of Solve pipeline')
+    parser.add_argument('--output', required=True, help='JSON file to write results to')
+    parser.add_argument('--compare', help='JSON results to compare with')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=1.2, help='slowdown ratio reported as regression')
+    parser.add_argument('--quick', action='store_true', help='only the two smallest sizes')
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    records = run(SWEEP[:2] if args.quick else SWEEP, repeat=args.repeat)
+    result = dict(created=time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)), python=platform.python_version(),
+                  numpy=np.__version__, machine=platform.machine(), processor=platform.processor(), records=records)
+    directory = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(records, json.load(f)['records'], args.threshold)
+        print('\n'.join(['Regressions:'] + regressions) if regressions else 'No regressions')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
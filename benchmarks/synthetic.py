@@ -0,0 +1,68 @@
+"""
+Synthetic data in the format of data_3_dst.txt: n rows, X1 X2 X3 Y columns separated by whitespace.
+
+Y has known structure of the method, additive over blocks of X with shifted Chebyshev polynomials:
+Y_i = sum_k c[i][k] * sum_{j in X_k} a[i][j] * sum_p lamb[j][p] * T*_p(x_j), x_j in [0, 1] before scaling.
+
+    python -m benchmarks.synthetic out.txt --samples 200 --dimensions 2 2 3 4 --degrees 3 3 3
+"""
+import argparse
+import json
+
+import numpy as np
+
+from algorithm.basis_generator import eval_sh_chebyshev
+
+
+def generate(samples, dimensions, degrees, noise=0.01, seed=0):
+    """
+    :param samples: number of rows
+    :param dimensions: [dim X1, dim X2, dim X3, dim Y]
+    :param degrees: polynomial degrees of X1, X2, X3
+    :param noise: standard deviation of gaussian noise relative to spread of every Y column
+    :return: (data with shape (samples, sum(dimensions)), dict of ground truth coefficients)
+    """
+    rng = np.random.RandomState(seed)
+    mX = sum(dimensions[:3])
+    x = rng.uniform(size=(samples, mX))
+    block = np.repeat(np.arange(3), dimensions[:3])  # block of every X column
+    lamb = [rng.uniform(-1, 1, size=degrees[k] + 1) for k in block]
+    a = rng.uniform(0.5, 1.5, size=(dimensions[3], mX))
+    c = rng.uniform(0.5, 1.5, size=(dimensions[3], 3))
+    psi = np.column_stack([eval_sh_chebyshev(x[:, j], degrees[block[j]] + 1).dot(lamb[j]) for j in range(mX)])
+    y = np.column_stack([(psi * a[i] * c[i][block]).sum(axis=1) for i in range(dimensions[3])])
+    y += noise * y.std(axis=0) * rng.standard_normal(y.shape)
+    # original units: X columns on their own ranges, Y positive like in the sample data
+    low = rng.uniform(0, 10, size=mX)
+    x = low + x * rng.uniform(1, 10, size=mX)
+    y = y - y.min(axis=0) + rng.uniform(50, 250, size=dimensions[3])
+    truth = dict(samples=samples, dimensions=list(dimensions), degrees=list(degrees), noise=noise, seed=seed,
+                 lamb=[l.tolist() for l in lamb], a=a.tolist(), c=c.tolist())
+    return np.hstack((x, y)), truth
+
+
+def write(filename, samples, dimensions, degrees, noise=0.01, seed=0):
+    """
+    Writes data to filename and ground truth to filename + '.json'
+    """
+    data, truth = generate(samples, dimensions, degrees, noise, seed)
+    np.savetxt(filename, data, fmt='%.6f', delimiter='\t')
+    with open(filename + '.json', 'w') as f:
+        json.dump(truth, f, indent=1)
+    return filename
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Writes synthetic data set')
+    parser.add_argument('output')
+    parser.add_argument('--samples', type=int, default=100)
+    parser.add_argument('--dimensions', type=int, nargs=4, default=[2, 2, 3, 4])
+    parser.add_argument('--degrees', type=int, nargs=3, default=[3, 3, 3])
+    parser.add_argument('--noise', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write(args.output, args.samples, args.dimensions, args.degrees, args.noise, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,20 +2,26 @@ __author__ = 'vlad'
 # coding: utf8
 
 import sys
+import time
 
-from PyQt5.QtCore import pyqtSlot, pyqtSignal
+START_TIME = time.perf_counter()  # reference point of time-to-window measurement, before any non-stdlib import
+
+import numpy as np
+from PyQt5.QtCore import pyqtSlot, pyqtSignal, QThread, QTimer
 from PyQt5.QtGui import QTextDocument, QFont
 from PyQt5.QtWidgets import QApplication, QDialog, QFileDialog, QMessageBox
-from PyQt5.uic import loadUiType
 
 from algorithm.presentation import PolynomialBuilder, PolynomialBuilderExpTh
 from algorithm.solve import Solve
 from algorithm.solve_custom import SolveExpTh
 from algorithm.bruteforce import BruteForceWindow
+from algorithm.fit_worker import FitWorker
+from algorithm.table_model import MatrixTableModel
+from algorithm.ui_loader import load_ui_type
+
+form_class, base_class = load_ui_type('main_window.ui')
 
-app = QApplication(sys.argv)
-app.setApplicationName('lab3_sa')
-form_class, base_class = loadUiType('main_window.ui')
+REPORT_ROWS = 20  # rows of every table in results text, whole matrices are in the matrices tab
 
 
 class MainWindow(QDialog, form_class):
@@ -50,6 +56,11 @@ class MainWindow(QDialog, form_class):
         self.lambda_multiblock = self.lambda_check.isChecked()
         self.weight_method = self.weights_box.currentText().lower()
         self.solution = None
+        self.fit_thread = None
+        self.fit_worker = None
+        self.matrices = list()
+        self.matrix_model = MatrixTableModel(parent=self)
+        self.matrix_view.setModel(self.matrix_model)
         doc = self.results_field.document()
         assert isinstance(doc, QTextDocument)
         font = doc.defaultFont()
@@ -151,22 +162,87 @@ class MainWindow(QDialog, form_class):
     @pyqtSlot()
     def exec_clicked(self):
         self.exec_button.setEnabled(False)
-        try:
-            if self.custom_func_struct:
-                solver = SolveExpTh(self._get_params())
-                solver.prepare()
-                self.solution = PolynomialBuilderExpTh(solver)
-                self.results_field.setText(solver.show()+'\n\n'+self.solution.get_results())
-            else:
-                solver = Solve(self._get_params())
-                solver.prepare()
-                self.solution = PolynomialBuilder(solver)
-                self.results_field.setText(solver.show()+'\n\n'+self.solution.get_results())
-        except Exception as e:
-            QMessageBox.warning(self,'Error!','Error happened during execution: ' + str(e))
-        self.exec_button.setEnabled(True)
+        self.cancel_button.setEnabled(True)
+        self.fit_progress.setValue(0)
+        if self.custom_func_struct:
+            self.fit_worker = FitWorker(SolveExpTh, PolynomialBuilderExpTh, self._get_params(), REPORT_ROWS)
+        else:
+            self.fit_worker = FitWorker(Solve, PolynomialBuilder, self._get_params(), REPORT_ROWS)
+        # fitting runs in its own thread, results come back with signals
+        self.fit_thread = QThread(self)
+        self.fit_worker.moveToThread(self.fit_thread)
+        self.fit_thread.started.connect(self.fit_worker.run)
+        self.fit_worker.progress.connect(self.fit_progressed)
+        self.fit_worker.finished.connect(self.fit_finished)
+        self.fit_worker.failed.connect(self.fit_failed)
+        self.fit_worker.cancelled.connect(self.fit_cancelled)
+        self.fit_thread.start()
+        return
+
+    @pyqtSlot()
+    def cancel_clicked(self):
+        if self.fit_worker:
+            self.cancel_button.setEnabled(False)
+            self.fit_worker.cancel()
+        return
+
+    @pyqtSlot(int, int, str)
+    def fit_progressed(self, index, count, stage):
+        self.fit_progress.setMaximum(count + 1)
+        self.fit_progress.setValue(index)
+        self.fit_progress.setFormat('%p% ' + stage)
+        return
+
+    @pyqtSlot(object, object, str)
+    def fit_finished(self, solver, builder, text):
+        self.solution = builder
+        self.results_field.setText(text)
+        # arrays are only referenced here, table view formats the cells it shows
+        self.matrices = [(title, values, None, None) for key, title, values in
+                         solver.export_arrays(solver.EXPORT_SECTIONS)]
+        if solver.stage_profile is not None:
+            stages, fields, rows = solver.stage_profile.as_table()
+            self.matrices.insert(0, ('Профиль этапов', np.array(rows), stages, fields))
+        self.matrix_box.blockSignals(True)
+        self.matrix_box.clear()
+        self.matrix_box.addItems([title for title, values, row_names, column_names in self.matrices])
+        self.matrix_box.blockSignals(False)
+        self.matrix_selected(self.matrix_box.currentIndex())
+        self.fit_progress.setValue(self.fit_progress.maximum())
+        self.fit_progress.setFormat('%p%')
+        self._stop_fit()
         return
 
+    @pyqtSlot(str)
+    def fit_failed(self, message):
+        self._stop_fit()
+        QMessageBox.warning(self, 'Error!', 'Error happened during execution: ' + message)
+        return
+
+    @pyqtSlot()
+    def fit_cancelled(self):
+        self.fit_progress.setValue(0)
+        self.fit_progress.setFormat('Cancelled')
+        self._stop_fit()
+        return
+
+    @pyqtSlot(int)
+    def matrix_selected(self, index):
+        if 0 <= index < len(self.matrices):
+            title, values, row_names, column_names = self.matrices[index]
+            self.matrix_model.set_values(values, row_names, column_names)
+        else:
+            self.matrix_model.set_values(None)
+        return
+
+    def _stop_fit(self):
+        self.fit_thread.quit()
+        self.fit_thread.wait()
+        self.fit_thread = None
+        self.fit_worker = None
+        self.cancel_button.setEnabled(False)
+        self.exec_button.setEnabled(True)
+
     @pyqtSlot()
     def bruteforce_called(self):
         BruteForceWindow.launch(self)
@@ -192,11 +268,18 @@ class MainWindow(QDialog, form_class):
     def _get_params(self):
         return dict(poly_type=self.type, degrees=self.degrees, dimensions=self.dimensions,
                     samples=self.samples_num, input_file=self.input_path, output_file=self.output_path,
-                    weights=self.weight_method, lambda_multiblock=self.lambda_multiblock)
+                    weights=self.weight_method, lambda_multiblock=self.lambda_multiblock,
+                    instrument=self.profile_check.isChecked())
 
 
 # -----------------------------------------------------#
-form = MainWindow()
-form.setWindowTitle('System Analysis - Lab 3')
-form.show()
-sys.exit(app.exec_())
+# guarded, so that worker processes of the degree search can import this module
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    app.setApplicationName('lab3_sa')
+    form = MainWindow()
+    form.setWindowTitle('System Analysis - Lab 3')
+    form.show()
+    # fires after the first pass of event loop, when window is already painted
+    QTimer.singleShot(0, lambda: print('Time to window: {:.3f} s'.format(time.perf_counter() - START_TIME)))
+    sys.exit(app.exec_())